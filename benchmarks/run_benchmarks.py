@@ -0,0 +1,348 @@
+# Group Members - Group P
+# Joana Esteves | 20240746 
+# Matilde Miguel | 20240549 
+# Tomás Figueiredo | 20240941 
+# Rita Serra | 20240515
+
+"""
+Offline benchmarks of the fitness, repair, operators and full genetic algorithm runs.
+
+Usage, from the root of the repository:
+    python -m benchmarks.run_benchmarks --output benchmarks.json
+    python -m benchmarks.run_benchmarks --output new.json --baseline benchmarks.json
+    python -m benchmarks.run_benchmarks --scaling --guests 64 300 1000 2000
+
+With --baseline, every benchmark is compared with the same benchmark in the baseline file and the ones
+slower by more than --threshold (20% by default) are flagged as regressions (exit code 1).
+With --scaling, only the time per generation of genetic algorithm runs with uneven table capacities is measured.
+"""
+
+# General
+import pandas as pd
+import numpy as np
+from functools import partial
+
+# Benchmarks
+import argparse
+import datetime
+import json
+import platform
+import sys
+import time
+
+# Seating arrangement problem
+from library.SA_problem.seating_arrangement import SAProblem, SASolution
+from library.SA_problem.sparse_relations import SparseRelations
+
+# Genetic algorithm
+from library.genetic_algorithms.algorithm import genetic_algorithm
+from library.genetic_algorithms.population import Population
+from library.genetic_algorithms.crossover import (
+    repair_repr, repair_reprs, cycle_crossover, one_point_crossover, uniform_crossover, geometric_crossover,
+    BATCHED_CROSSOVER
+)
+from library.genetic_algorithms.mutation import (
+    swap_mutation, inversion_mutation, heuristic_mutation, steepest_heuristic_mutation, misfit_mutation
+)
+from library.genetic_algorithms.selection import (
+    fitness_proportionate_selection, ranking_selection, tournament_selection, BATCHED_SELECTION
+)
+
+CROSSOVERS = [cycle_crossover, one_point_crossover, uniform_crossover, geometric_crossover]
+MUTATIONS = [swap_mutation, inversion_mutation, heuristic_mutation, steepest_heuristic_mutation, misfit_mutation]
+SELECTIONS = [fitness_proportionate_selection, ranking_selection, tournament_selection]
+
+def synthetic_relations(relations_mtx: np.ndarray, nr_guests: int, seed: int = 0) -> np.ndarray:
+    """
+    Scales a relationship matrix up (or down) to nr_guests guests. Each new guest is a copy of a random
+    guest of the original matrix, so the new matrix keeps the distribution of relationship scores.
+
+    Parameters:
+        relations_mtx (np.ndarray): The original relationship matrix, e.g. the one of seating_data.csv.
+        nr_guests (int): Number of guests of the new matrix.
+        seed (int): Seed of the choice of guests. Defaults to 0.
+
+    Returns:
+        np.ndarray: A (nr_guests, nr_guests) relationship matrix with a zero diagonal.
+    """
+
+    if nr_guests == len(relations_mtx):
+        return relations_mtx
+
+    sources = np.random.default_rng(seed).integers(0, len(relations_mtx), size=nr_guests)
+    scaled = relations_mtx[np.ix_(sources, sources)].copy()
+    np.fill_diagonal(scaled, 0)
+
+    return scaled
+
+def uneven_capacities(nr_guests: int, table_size: int = 10) -> np.ndarray:
+    """
+    Capacities of tables of about table_size guests, alternating smaller and larger tables.
+
+    Parameters:
+        nr_guests (int): Number of guests.
+        table_size (int): Average number of guests per table. Defaults to 10.
+
+    Returns:
+        np.ndarray: Number of guests of each table, adding up to nr_guests.
+    """
+
+    nr_tables = max(1, nr_guests // table_size)
+    capacities = np.full(nr_tables, nr_guests // nr_tables)
+    capacities[:nr_guests % nr_tables] += 1
+
+    # Move up to two seats from every other table to the next one
+    shift = min(2, int(capacities.min()) - 1)
+    pairs = nr_tables - nr_tables % 2
+    capacities[0:pairs:2] -= shift
+    capacities[1:pairs:2] += shift
+
+    return capacities
+
+def time_call(function, min_time: float = 0.2, repeat: int = 3) -> float:
+    """
+    Times a function without arguments: calls it in loops of growing size until a loop lasts
+    min_time seconds, then returns the best time per call of repeat loops of that size.
+
+    Returns:
+        float: Seconds per call.
+    """
+
+    number = 1
+
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+
+        if elapsed >= min_time:
+            break
+
+        number *= 2 if elapsed == 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    timings = [elapsed / number]
+
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        timings.append((time.perf_counter() - start) / number)
+
+    return min(timings)
+
+def run_benchmarks(relations_mtx: np.ndarray, guest_counts: list[int], pop_sizes: list[int], generations: int = 20,
+                   min_time: float = 0.2, verbose: bool = True) -> dict:
+    """
+    Times the fitness, the repair, each operator and full genetic algorithm runs, for each number
+    of guests (synthetic matrices scaled from relations_mtx) and population size.
+
+    Parameters:
+        relations_mtx (np.ndarray): The original relationship matrix.
+        guest_counts (list[int]): Numbers of guests, seated at 8 tables.
+        pop_sizes (list[int]): Population sizes of the batched and end-to-end benchmarks.
+        generations (int): Generations of the end-to-end runs. Defaults to 20.
+        min_time (float): Minimum duration of each timing loop, in seconds. Defaults to 0.2.
+        verbose (bool): If True, prints each result. Defaults to True.
+
+    Returns:
+        dict: For each benchmark name, its seconds per call and parameters.
+    """
+
+    results = {}
+
+    def record(name, seconds, **params):
+        results[name] = {"seconds": seconds, **params}
+        if verbose:
+            print(f"{name:<70} {seconds * 1e6:>14.1f} us")
+
+    for nr_guests in guest_counts:
+        mtx = synthetic_relations(relations_mtx, nr_guests)
+        problem = SAProblem(mtx)
+        rng = np.random.default_rng(0)
+
+        repr1 = SASolution(problem, rng=rng).repr
+        repr2 = SASolution(problem, rng=rng).repr
+        broken = rng.integers(0, problem.nr_tables, size=nr_guests)
+
+        record(f"fitness/SASolution.fitness/guests={nr_guests}",
+               time_call(lambda: SASolution.from_validated(problem, repr1).fitness(), min_time), guests=nr_guests)
+        record(f"repair/repair_repr/guests={nr_guests}",
+               time_call(lambda: repair_repr(broken, problem.capacities), min_time), guests=nr_guests)
+
+        for crossover in CROSSOVERS:
+            record(f"crossover/{crossover.__name__}/guests={nr_guests}",
+                   time_call(lambda: crossover(repr1, repr2, rng=rng), min_time), guests=nr_guests)
+
+        for mutation in MUTATIONS:
+            record(f"mutation/{mutation.__name__}/guests={nr_guests}",
+                   time_call(lambda: mutation(repr1, mtx, rng=rng), min_time), guests=nr_guests)
+
+        for pop_size in pop_sizes:
+            population = Population.random(problem, pop_size, rng=rng)
+            population.evaluate()
+            reprs = population.reprs
+            broken_block = rng.integers(0, problem.nr_tables, size=(pop_size, nr_guests))
+
+            record(f"fitness/batch_fitness/guests={nr_guests}/pop={pop_size}",
+                   time_call(lambda: problem.batch_fitness(reprs), min_time), guests=nr_guests, pop=pop_size)
+            record(f"repair/repair_reprs/guests={nr_guests}/pop={pop_size}",
+                   time_call(lambda: repair_reprs(broken_block, problem.capacities), min_time), guests=nr_guests, pop=pop_size)
+
+            # Batched crossover of pop_size / 2 pairs
+            half = pop_size // 2
+            for crossover in CROSSOVERS:
+                batched = BATCHED_CROSSOVER[crossover]
+                record(f"crossover/{batched.__name__}/guests={nr_guests}/pop={pop_size}",
+                       time_call(lambda: batched(reprs[:half], reprs[half:2 * half], rng=rng), min_time),
+                       guests=nr_guests, pop=pop_size)
+
+            # Selection of all the parents of a generation
+            for selection in SELECTIONS:
+                batched = BATCHED_SELECTION[selection]
+                record(f"selection/{batched.__name__}/guests={nr_guests}/pop={pop_size}",
+                       time_call(lambda: batched(population.fitness, pop_size, rng=rng), min_time),
+                       guests=nr_guests, pop=pop_size)
+
+            # Fixed seed end-to-end run, its final fitness shows changes of behaviour
+            run = partial(genetic_algorithm, problem, pop_size, generations, tournament_selection, swap_mutation,
+                          cycle_crossover, xo_prob=0.9, mut_prob=0.1, elitism=1, rng=0)
+            start = time.perf_counter()
+            _, best_fitness_per_gen = run()
+            seconds = time.perf_counter() - start
+            record(f"genetic_algorithm/guests={nr_guests}/pop={pop_size}/gens={generations}", seconds,
+                   guests=nr_guests, pop=pop_size, generations=generations, best_fitness=float(best_fitness_per_gen[-1]))
+
+    return results
+
+def run_scaling_benchmarks(relations_mtx: np.ndarray, guest_counts: list[int], pop_sizes: list[int],
+                           generations: int = 5, sparse: bool = False, verbose: bool = True) -> dict:
+    """
+    Times genetic algorithm runs on large events, with tables of uneven capacities (see uneven_capacities),
+    for each number of guests and population size.
+
+    Parameters:
+        relations_mtx (np.ndarray): The original relationship matrix.
+        guest_counts (list[int]): Numbers of guests.
+        pop_sizes (list[int]): Population sizes.
+        generations (int): Generations of each run. Defaults to 5.
+        sparse (bool): If True, the relationships are stored as SparseRelations. Defaults to False.
+        verbose (bool): If True, prints each result. Defaults to True.
+
+    Returns:
+        dict: For each benchmark name, its seconds per generation and parameters.
+    """
+
+    results = {}
+
+    for nr_guests in guest_counts:
+        mtx = synthetic_relations(relations_mtx, nr_guests)
+        if sparse:
+            mtx = SparseRelations.from_dense(mtx)
+
+        problem = SAProblem(mtx, capacities=uneven_capacities(nr_guests))
+
+        for pop_size in pop_sizes:
+            for mutation in (swap_mutation, heuristic_mutation):
+                start = time.perf_counter()
+                _, best_fitness_per_gen = genetic_algorithm(problem, pop_size, generations, tournament_selection, mutation,
+                                                            cycle_crossover, xo_prob=0.9, mut_prob=0.1, elitism=1, rng=0)
+                seconds = (time.perf_counter() - start) / generations
+
+                name = f"{'scaling-sparse' if sparse else 'scaling'}/genetic_algorithm/{mutation.__name__}/guests={nr_guests}/tables={problem.nr_tables}/pop={pop_size}"
+                results[name] = {"seconds": seconds, "guests": nr_guests, "tables": problem.nr_tables, "pop": pop_size,
+                                 "generations": generations, "best_fitness": float(best_fitness_per_gen[-1])}
+                if verbose:
+                    print(f"{name:<90} {seconds * 1e6:>14.1f} us")
+
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float = 0.2) -> list[str]:
+    """
+    Compares the results with a baseline and prints the ratio of the times of every benchmark in both.
+
+    Parameters:
+        results (dict): The benchmarks of the current run.
+        baseline (dict): The benchmarks of the baseline.
+        threshold (float): Relative slowdown above which a benchmark is a regression. Defaults to 0.2 (20%).
+
+    Returns:
+        list[str]: Names of the regressed benchmarks.
+    """
+
+    regressions = []
+
+    print(f"\n{'benchmark':<70} {'baseline':>12} {'current':>12} {'ratio':>8}")
+
+    for name in sorted(set(results) & set(baseline)):
+        base_seconds = baseline[name]["seconds"]
+        seconds = results[name]["seconds"]
+        ratio = seconds / base_seconds if base_seconds > 0 else float("inf")
+
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+
+        # Fixed seed runs should find the same fitness, unless the behaviour changed
+        if "best_fitness" in results[name] and results[name]["best_fitness"] != baseline[name].get("best_fitness"):
+            flag += "  fitness changed"
+
+        print(f"{name:<70} {base_seconds * 1e6:>10.1f}us {seconds * 1e6:>10.1f}us {ratio:>8.2f}{flag}")
+
+    missing = sorted(set(baseline) - set(results))
+    if missing:
+        print(f"\nBenchmarks of the baseline that were not run: {', '.join(missing)}")
+
+    print(f"\n{len(regressions)} regression(s) above {threshold:.0%}")
+
+    return regressions
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of the seating arrangement genetic algorithm.")
+    parser.add_argument("--data", default="seating_data.csv", help="Relationship matrix csv to scale the synthetic matrices from.")
+    parser.add_argument("--guests", type=int, nargs="+", default=None,
+                        help="Numbers of guests. Defaults to 64 128 256, or 64 300 1000 2000 with --scaling.")
+    parser.add_argument("--pop-sizes", type=int, nargs="+", default=[100, 1000], help="Population sizes.")
+    parser.add_argument("--generations", type=int, default=20, help="Generations of the end-to-end runs.")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum duration of each timing loop, in seconds.")
+    parser.add_argument("--scaling", action="store_true", help="Only time generations of large events with uneven tables.")
+    parser.add_argument("--sparse", action="store_true", help="With --scaling, store the relationships as sparse relations.")
+    parser.add_argument("--output", default=None, help="Json file to write the results to.")
+    parser.add_argument("--baseline", default=None, help="Json file of a previous run to compare with.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative slowdown flagged as a regression.")
+    args = parser.parse_args(argv)
+
+    relations_mtx = pd.read_csv(args.data, index_col=0).to_numpy()
+
+    if args.scaling:
+        guest_counts = args.guests or [64, 300, 1000, 2000]
+        results = run_scaling_benchmarks(relations_mtx, guest_counts, args.pop_sizes, args.generations, args.sparse)
+    else:
+        results = run_benchmarks(relations_mtx, args.guests or [64, 128, 256], args.pop_sizes, args.generations, args.min_time)
+
+    report = {
+        "metadata": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+        },
+        "results": results,
+    }
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,35 +6,616 @@
 
 # General
 import numpy as np
+from collections import OrderedDict
+from typing import Callable
+
+# Shared problem data
+import os
+import shutil
+import tempfile
+
+# Sparse relationship scores
+from library.SA_problem.sparse_relations import SparseRelations
+
+def table_slots(capacities: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Layout used to gather the guests of every table from the guests sorted by table.
+
+    With the guests of an arrangement sorted by table (a stable argsort of its representation), 
+    the guests of table t are at positions starts[t] to starts[t] + capacities[t] - 1. The slots 
+    of each table are padded up to the largest capacity, repeating the table's last position.
+
+    Parameters:
+        capacities (np.ndarray): Number of guests of each table.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (nr_tables, max_capacity) positions in the sorted guests, and 
+        the mask of the slots that hold a guest (False for the padding).
+    """
+
+    capacities = np.asarray(capacities)
+    starts = np.cumsum(capacities) - capacities
+    slot = np.arange(capacities.max())
+
+    slots = starts[:, None] + np.minimum(slot, capacities[:, None] - 1)
+    mask = slot < capacities[:, None]
+
+    return slots, mask
+
+def seated_together(repr: np.ndarray, mtx: np.ndarray) -> np.ndarray:
+    """
+    For every guest, the sum of mtx[g][other] over the other guests at the same table, 
+    computed table by table in O(nr_guests * table size) instead of O(nr_guests^2).
+
+    With sparse relations, it is O(relationships).
+
+    Parameters:
+        repr (np.ndarray): Array where each index represents a guest and the value is its table.
+        mtx (np.ndarray | SparseRelations): A (nr_guests, nr_guests) matrix, e.g. the relationship scores.
+
+    Returns:
+        np.ndarray: The sum of each guest, with the type of the matrix entries.
+    """
+
+    if isinstance(mtx, SparseRelations):
+        return mtx.same_table_sums(repr) - mtx.diagonal()
+
+    capacities = np.bincount(repr)
+    slots, mask = table_slots(capacities[capacities > 0])
+
+    # (nr_tables, max_capacity) guests of each table, then the scores between every two of them
+    members = np.argsort(repr, kind="stable")[slots]
+    block = np.asarray(mtx)[members[:, :, None], members[:, None, :]]
+    block = np.where(mask[:, None, :], block, 0)
+
+    totals = np.zeros(len(repr), dtype=block.dtype)
+    totals[members[mask]] = block.sum(axis=2)[mask]
+
+    # A guest does not count towards its own sum
+    return totals - np.diagonal(mtx)
+
+def validate_reprs(reprs: np.ndarray, nr_guests: int, nr_tables: int, capacities: np.ndarray | None = None) -> np.ndarray:
+    """
+    Batched version of SASolution.validate_repr for a (nr_solutions, nr_guests) block.
+    capacities is the number of guests of each table, by default nr_guests // nr_tables for every table.
+
+    Returns:
+        np.ndarray: The validated block.
+
+    Raises ValueError if any representation is not valid.
+    """
+
+    if reprs.ndim != 2 or reprs.shape[1] != nr_guests:
+        raise ValueError(f"Representation needs to have {nr_guests} guests.")
+
+    if np.any((reprs < 0) | (reprs >= nr_tables)):
+        raise ValueError(f"Table assignments must be between 0 and {nr_tables - 1}.")
+
+    # Count guests per table for all rows at once by offsetting each row's table ids
+    offsets = np.arange(len(reprs))[:, None] * nr_tables
+    counts = np.bincount((reprs + offsets).ravel(), minlength=len(reprs) * nr_tables).reshape(len(reprs), nr_tables)
+
+    if capacities is None:
+        capacities = np.full(nr_tables, nr_guests // nr_tables)
+
+    if np.any(counts != capacities):
+        raise ValueError(f"Each table must have exactly its capacity of guests: {list(capacities)}.")
+
+    return reprs
+
+def canonical_reprs(reprs: np.ndarray) -> np.ndarray:
+    """
+    Relabels the tables of a block of seating arrangements in a canonical order: the table of 
+    guest 0 becomes table 0, the next table in guest order becomes table 1, and so on. Table labels 
+    are interchangeable, so two arrangements seat the same groups together if and only if their 
+    canonical forms are equal.
+
+    Parameters:
+        reprs (np.ndarray): A (nr_solutions, nr_guests) array, one arrangement per row.
+
+    Returns:
+        np.ndarray: The relabeled block, with the type of reprs.
+    """
+
+    nr_solutions, nr_guests = reprs.shape
+    nr_tables = int(reprs.max()) + 1 if reprs.size else 0
+
+    # First guest of every table, per arrangement (nr_guests for tables with no guests)
+    first_guest = np.full((nr_solutions, nr_tables), nr_guests)
+    np.minimum.at(first_guest, (np.arange(nr_solutions)[:, None], reprs), np.arange(nr_guests))
+
+    # New label of every table: its rank by first guest
+    labels = np.argsort(np.argsort(first_guest, axis=1, kind="stable"), axis=1)
+
+    return np.take_along_axis(labels, reprs.astype(np.intp), axis=1).astype(reprs.dtype)
+
+def canonical_keys(reprs: np.ndarray) -> list[bytes]:
+    """
+    Hashable keys of a block of seating arrangements: the bytes of their canonical forms 
+    (see canonical_reprs), equal for arrangements that seat the same groups together.
+    """
+
+    canonical = np.ascontiguousarray(canonical_reprs(reprs), dtype=repr_dtype(int(reprs.max()) + 1))
+
+    return [row.tobytes() for row in canonical]
+
+class FitnessCache():
+
+    def __init__(self, maxsize: int = 10000):
+        """
+        Bounded least recently used (LRU) cache of fitness values, keyed on the canonical form of 
+        the arrangements (see canonical_reprs), so arrangements that only differ in the labels of 
+        their tables share one entry.
+
+        A cache belongs to its caller (e.g. one genetic_algorithm run) and is passed explicitly to 
+        SAProblem.evaluate and Population.evaluate. It is not attached to the problem, which every 
+        run on the same matrix shares, so SASolution.fitness() does not use it. Inside the genetic 
+        algorithm this costs little: selection reads the fitness vector of the population, and 
+        the solutions it builds carry the fitness already computed through the cache.
+
+        Parameters:
+            maxsize (int): Maximum number of arrangements kept. Defaults to 10000.
+        """
+
+        if maxsize < 1:
+            raise ValueError("The cache size must be at least 1.")
+
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(self, reprs: np.ndarray, evaluate: Callable) -> np.ndarray:
+        """
+        Fitness of a block of arrangements: cached values are reused and the others are computed 
+        with one call of evaluate, each distinct arrangement once, and added to the cache.
+
+        Parameters:
+            reprs (np.ndarray): A (nr_solutions, nr_guests) array, one arrangement per row.
+            evaluate (Callable): Function reprs -> fitness scoring a block.
+
+        Returns:
+            np.ndarray: The fitness of each arrangement as floats.
+        """
+
+        keys = canonical_keys(reprs)
+        fitness = np.empty(len(keys))
+
+        # Rows of each arrangement that is not cached, by key
+        missing = {}
+
+        for row, key in enumerate(keys):
+            value = self.entries.get(key)
+
+            if value is None:
+                missing.setdefault(key, []).append(row)
+            else:
+                self.entries.move_to_end(key)
+                fitness[row] = value
+
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            first_rows = [rows[0] for rows in missing.values()]
+            values = evaluate(reprs[first_rows])
+
+            for (key, rows), value in zip(missing.items(), values):
+                fitness[rows] = value
+                self.entries[key] = float(value)
+
+            # Evict the least recently used arrangements
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+        return fitness
+
+    def stats(self) -> dict:
+        """
+        Hit and miss counters of the cache.
+
+        Returns:
+            dict: hits, misses, hit_rate (hits over lookups, 0 before any lookup), size and maxsize.
+        """
+
+        lookups = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+def as_generator(rng: np.random.Generator | int | None = None) -> np.random.Generator:
+    """
+    Returns rng if it is already a numpy Generator, or a new Generator seeded with it 
+    (an int, a SeedSequence or None for fresh entropy).
+
+    Every random operator takes its randomness from an explicit Generator, so a run seeded 
+    with one is reproducible and independent of the global random state of the process.
+    """
+
+    if isinstance(rng, np.random.Generator):
+        return rng
+
+    return np.random.default_rng(rng)
+
+def repr_dtype(nr_tables: int) -> np.dtype:
+    """
+    Smallest integer type able to hold the table ids, used for compact population storage.
+    """
+
+    return np.dtype(np.int8) if nr_tables <= np.iinfo(np.int8).max else np.dtype(np.int16)
+
+# Problems that were shared with worker processes, by the path of their memory-mapped data
+_shared_problems = {}
+
+def _load_shared(path: str, name: str) -> "np.ndarray | SparseRelations":
+    # Dense matrices are saved as one .npy file, sparse relations as a directory of arrays
+    if os.path.isdir(os.path.join(path, name)):
+        return SparseRelations.load(os.path.join(path, name), mmap_mode="r")
+
+    return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+def _attach_problem(path: str, capacities: np.ndarray) -> "SAProblem":
+    """
+    Unpickles a shared problem: returns the problem already attached to this process, 
+    or attaches to the memory-mapped copy of its matrices.
+    """
+
+    if path not in _shared_problems:
+        problem = SAProblem(_load_shared(path, "relations_mtx"), capacities=capacities)
+        problem._upper = _load_shared(path, "upper")
+        problem._weights = _load_shared(path, "weights")
+        problem._shared_path = path
+        _shared_problems[path] = problem
+
+    return _shared_problems[path]
+
+class SAProblem():
+
+    def __init__(self, relations_mtx: "np.ndarray | SparseRelations", nr_tables: int = 8,
+                 capacities: np.ndarray | list[int] | None = None):
+        """
+        Seating arrangement problem instance.
+
+        The instance owns the relationship matrix, and the matrices derived from it, once.
+        Solutions and populations only keep a reference to the problem, so copying or pickling
+        a solution does not duplicate the matrix.
+
+        Any number of guests and tables is supported, and tables can have different sizes. 
+        All operators derive the number of guests, of tables and the table sizes from the problem 
+        (or from valid parents).
+
+        The scores can also be sparse (SparseRelations, or a scipy.sparse matrix which is converted 
+        to it). Then the matrices derived from them are sparse too, and the fitness, affinities and 
+        swap deltas only visit the non-zero relationships.
+
+        Parameters:
+            relations_mtx (np.ndarray | SparseRelations): A square numpy array with the pairwise relationship 
+                scores, or the same scores as sparse relations.
+            nr_tables (int): Number of tables, used when no capacities are given. Defaults to 8.
+            capacities (np.ndarray | list[int] | None): Number of guests of each table, adding up to the 
+                number of guests. Defaults to nr_tables tables of equal size, the first 
+                nr_guests % nr_tables tables getting one guest more when the guests do not divide evenly.
+        """
+
+        # Sparse matrices of scipy (or any other with a tocoo method) are converted to sparse relations
+        if not isinstance(relations_mtx, (np.ndarray, SparseRelations)) and hasattr(relations_mtx, "tocoo"):
+            relations_mtx = SparseRelations.from_scipy(relations_mtx)
+
+        self.relations_mtx = relations_mtx
+        self.sparse = isinstance(relations_mtx, SparseRelations)
+        self.nr_guests = relations_mtx.shape[0]
+
+        if capacities is None:
+            capacities = np.full(nr_tables, self.nr_guests // nr_tables)
+            capacities[:self.nr_guests % nr_tables] += 1
+
+        capacities = np.asarray(capacities, dtype=np.intp)
+
+        if capacities.sum() != self.nr_guests or np.any(capacities < 1):
+            raise ValueError(f"Table capacities must be positive and add up to the {self.nr_guests} guests.")
+
+        self.capacities = capacities
+        self.nr_tables = len(capacities)
+        self.slots, self.slots_mask = table_slots(capacities)
+
+        self._upper = None
+        self._weights = None
+        self._shared_path = None
+
+    @classmethod
+    def of(cls, relations_mtx: "np.ndarray | SAProblem") -> "SAProblem":
+        """
+        Returns the problem for a relationship matrix. Problems are returned as they are, and a raw 
+        matrix gets a new problem with the default tables. No problem is kept between calls, so pass 
+        an SAProblem to share its derived matrices and table capacities between solutions.
+
+        Parameters:
+            relations_mtx (np.ndarray | SAProblem): A relationship matrix or a problem.
+
+        Returns:
+            SAProblem: The problem instance.
+        """
+
+        if isinstance(relations_mtx, SAProblem):
+            return relations_mtx
+
+        return cls(relations_mtx)
+
+    @property
+    def upper(self) -> np.ndarray:
+        """
+        Upper triangle of the matrix (without diagonal) as floats, so each pair of guests (i, j) 
+        with i < j contributes relations_mtx[i][j] once, exactly as in the pairwise definition.
+        SparseRelations for sparse problems.
+        """
+
+        if self._upper is None:
+            if self.sparse:
+                self._upper = self.relations_mtx.triu(1).astype(float)
+            else:
+                self._upper = np.triu(self.relations_mtx, 1).astype(float)
+
+        return self._upper
+
+    @property
+    def weights(self) -> np.ndarray:
+        """
+        Symmetric pair weight matrix used by the incremental (delta) fitness engine.
+
+        W[i][j] = W[j][i] = relations_mtx[min(i, j)][max(i, j)] and the diagonal is zero, so the 
+        fitness of an arrangement is half the sum of W over all pairs seated at the same table.
+        SparseRelations for sparse problems.
+        """
+
+        if self._weights is None:
+            self._weights = self.upper.symmetric() if self.sparse else self.upper + self.upper.T
+
+        return self._weights
+
+    def score(self, value):
+        """
+        Converts a fitness value computed in floating point back to the type of the matrix entries,
+        so integer scores stay integers.
+        """
+
+        if np.issubdtype(self.relations_mtx.dtype, np.integer):
+            return self.relations_mtx.dtype.type(np.rint(value))
+
+        return value
+
+    def pair_weight(self, guest1: int, guest2: int):
+        """
+        Weight W[guest1][guest2] of a pair of guests.
+        """
+
+        if self.sparse:
+            return self.weights.get(guest1, guest2)
+
+        return self.weights[guest1, guest2]
+
+    def neighbours(self, guest: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The guests a guest has a weight with and the weights: only the non-zero ones in 
+        O(relationships of the guest) for sparse problems, every guest otherwise.
+        """
+
+        if self.sparse:
+            return self.weights.row(guest)
+
+        return np.arange(self.nr_guests), self.weights[guest]
+
+    def table_members(self, reprs: np.ndarray) -> np.ndarray:
+        """
+        Guests of every table of a block of valid seating arrangements.
+
+        Parameters:
+            reprs (np.ndarray): A (nr_solutions, nr_guests) array, one arrangement per row.
+
+        Returns:
+            np.ndarray: A (nr_solutions, nr_tables, max_capacity) array with the guests of each table, 
+            padded with the table's last guest (see slots_mask).
+        """
+
+        return np.argsort(reprs, axis=1, kind="stable")[:, self.slots]
+
+    def batch_fitness(self, reprs: np.ndarray) -> np.ndarray:
+        """
+        Vectorized fitness of a whole block of seating arrangements in one call.
+
+        Only the scores between guests of the same table are gathered, so the cost is 
+        O(nr_guests * table size) per arrangement instead of O(nr_guests^2). Rows are processed 
+        in chunks to bound the memory of the gathered blocks. Sparse problems only visit the 
+        non-zero relationships, in O(relationships) per arrangement.
+
+        Parameters:
+            reprs (np.ndarray): A (nr_solutions, nr_guests) array of valid arrangements, one per row.
+
+        Returns:
+            np.ndarray: The fitness of each arrangement as floats.
+        """
+
+        if self.sparse:
+            return self.upper.same_table_total(reprs)
+
+        weights = self.weights
+        max_capacity = self.slots.shape[1]
+        pair_mask = self.slots_mask[:, :, None] & self.slots_mask[:, None, :]
+        padded = not np.all(self.slots_mask)
+
+        fitness = np.empty(len(reprs))
+        chunk = max(1, 2**22 // (self.nr_guests * max_capacity))
+
+        for start in range(0, len(reprs), chunk):
+            members = self.table_members(reprs[start:start + chunk])
+
+            # (rows, nr_tables, max_capacity, max_capacity) weights between guests of the same table,
+            # each pair counted twice by the symmetric weights
+            block = weights[members[..., :, None], members[..., None, :]]
+            if padded:
+                block = block * pair_mask
+
+            fitness[start:start + chunk] = block.sum(axis=(1, 2, 3)) / 2
+
+        return fitness
+
+    def affinity(self, repr: np.ndarray) -> np.ndarray:
+        """
+        Affinity of each guest to every table of an arrangement: [g][t] is the sum of the weights 
+        between guest g and the guests seated at table t. Computed with one pass over the weight 
+        matrix, in O(nr_guests^2), or O(relationships + nr_guests * nr_tables) for sparse problems.
+
+        Parameters:
+            repr (np.ndarray): A valid seating arrangement.
+
+        Returns:
+            np.ndarray: A (nr_guests, nr_tables) float matrix.
+        """
+
+        if self.sparse:
+            return self.weights.table_sums(repr, self.nr_tables)
+
+        order = np.argsort(repr, kind="stable")
+        starts = np.cumsum(self.capacities) - self.capacities
+
+        return np.add.reduceat(self.weights[:, order], starts, axis=1)
+
+    def fitness(self, repr: np.ndarray):
+        """
+        Vectorized fitness of a single seating arrangement.
+
+        Returns:
+            The total happiness score, with the same type as the matrix entries.
+        """
+
+        return self.score(self.evaluate(repr[None, :])[0])
+
+    def evaluate(self, reprs: np.ndarray, evaluator: Callable | None = None, cache: FitnessCache | None = None) -> np.ndarray:
+        """
+        Fitness of a block of valid seating arrangements, through a fitness cache if one is given.
+
+        Parameters:
+            reprs (np.ndarray): A (nr_solutions, nr_guests) array, one arrangement per row.
+            evaluator (Callable | None): Function (problem, reprs) -> fitness scoring the arrangements that 
+                are not cached (see evaluation.py). Defaults to batch_fitness.
+            cache (FitnessCache | None): Cache of the caller (e.g. of one genetic algorithm run). 
+                The problem itself keeps no cache, since it is shared by every run on the same matrix. 
+                Defaults to None.
+
+        Returns:
+            np.ndarray: The fitness of each arrangement as floats.
+        """
+
+        if evaluator is None:
+            evaluate = self.batch_fitness
+        else:
+            evaluate = lambda block: evaluator(self, block)
+
+        if cache is None:
+            return evaluate(reprs)
+
+        return cache.evaluate(reprs, evaluate)
+
+    def share(self) -> "SAProblem":
+        """
+        Moves the matrices to memory-mapped files so worker processes attach to one shared copy.
+        After this, pickling the problem (or any solution referencing it) only sends the path
+        of the files instead of the matrices, so the tasks of the parallel searches (grid search, 
+        successive halving, island model, process pool evaluator) do not each carry a copy of 
+        the O(nr_guests^2) matrices. Call release() when the workers are done.
+
+        Returns:
+            SAProblem: The problem itself.
+        """
+
+        if self._shared_path is None:
+            path = tempfile.mkdtemp(prefix="sa_problem_")
+
+            for name, mtx in (("relations_mtx", self.relations_mtx), ("upper", self.upper), ("weights", self.weights)):
+                if self.sparse:
+                    mtx.save(os.path.join(path, name))
+                else:
+                    np.save(os.path.join(path, f"{name}.npy"), mtx)
+
+            self._shared_path = path
+            _shared_problems[path] = self
+
+        return self
+
+    def release(self):
+        """
+        Deletes the memory-mapped files created by share().
+        """
+
+        if self._shared_path is not None:
+            _shared_problems.pop(self._shared_path, None)
+            shutil.rmtree(self._shared_path, ignore_errors=True)
+            self._shared_path = None
+
+    def __reduce__(self):
+        # Shared problems are pickled as a reference to their memory-mapped files
+        if self._shared_path is not None:
+            return (_attach_problem, (self._shared_path, self.capacities))
+
+        return super().__reduce__()
 
 class SASolution():
 
-    def __init__ (self, relations_mtx: np.ndarray, repr: np.ndarray = None):
+    def __init__ (self, relations_mtx: np.ndarray | SAProblem, repr: np.ndarray = None, rng: np.random.Generator | None = None):
         """
         Initializes a seating arrangement.
         
         Parameters:
-        - relations_mtx: A 64x64 numpy array with the pairwise relationship scores.
-        - repr: A numpy array of length 64, where each index represents a guest
+        - relations_mtx: A square numpy array with the pairwise relationship scores (64x64 for the wedding), 
+          or the SAProblem owning it, which also defines the tables. Only a reference to the shared problem instance is kept.
+        - repr: A numpy array with one element per guest, where each index represents a guest
+        - rng: Random generator of the random initial representation, used when repr is None.
 
         """
 
-        self.relations_mtx = relations_mtx
-        self.nr_tables = 8
-        self.nr_guests = 64
+        self.problem = SAProblem.of(relations_mtx)
+        self.nr_tables = self.problem.nr_tables
+        self.nr_guests = self.problem.nr_guests
         
         if  repr is not None:
             repr = self.validate_repr(repr)
         else:
-            repr = self.random_initial_representation()
+            repr = self.random_initial_representation(rng)
 
         self.repr = repr
 
+    @property
+    def relations_mtx(self) -> np.ndarray:
+        return self.problem.relations_mtx
+
+    @property
+    def repr(self) -> np.ndarray:
+        return self._repr
+
+    @repr.setter
+    def repr(self, repr: np.ndarray):
+        # A new arrangement invalidates the cached fitness and affinity
+        self._repr = repr
+        self._fitness = None
+        self._affinity = None
+
     def validate_repr(self, repr: np.ndarray) -> np.ndarray:
         """
         Validates the representation:
-        - Make sure there are 8 tables and 64 guests
-        - Make sure each table has exactly 8 guests (64/8)
+        - Make sure there is one table assignment per guest of the problem
+        - Make sure each table has exactly its capacity of guests in the problem
         - Make sure all guests are assigned to a table and only one table
 
         Returns:
@@ -43,37 +624,41 @@ class SASolution():
         Raises ValueError if the representation is not valid
         """
        
-        # Verify if the representation has the correct number of guests (64)
+        # Verify if the representation has the correct number of guests
         if repr.shape[0] != self.nr_guests:
             raise ValueError(f"Representation needs to have {self.nr_guests} guests.")
 
-        # Check if all guests are assigned to tables in the range 0 to 7
+        # Check if all guests are assigned to tables in the range 0 to nr_tables - 1
         if not np.all(np.isin(repr, range(self.nr_tables))):
-            raise ValueError("Table assignments must be between 0 and 7.")
+            raise ValueError(f"Table assignments must be between 0 and {self.nr_tables - 1}.")
 
         # Check that each table has the correct number of guests
+        counts = np.bincount(repr, minlength=self.nr_tables)
         for table in range(self.nr_tables):
-            if np.sum(repr == table) != (self.nr_guests // self.nr_tables):
-                raise ValueError(f"Table {table} must have exactly {self.nr_guests // self.nr_tables} guests.")
+            if counts[table] != self.problem.capacities[table]:
+                raise ValueError(f"Table {table} must have exactly {self.problem.capacities[table]} guests.")
 
         return repr
 
-    def random_initial_representation(self) -> np.ndarray:
+    def random_initial_representation(self, rng: np.random.Generator | None = None) -> np.ndarray:
 
         """
         Generates a random seating arrangement.
-        Each guest is randomly assigned to one and only one of the 8 tables.
+        Each guest is randomly assigned to one and only one of the tables, filling each table to its capacity.
+
+        Parameters:
+        - rng: Random generator to draw from. Defaults to a new unseeded generator.
 
         Returns:
         - A numpy array with the initial seating arrangement.
         """
 
-        # Make array with the index of the tables from 0 to 7
-        # Repeat that array by the nº of guests per table (64 guests/8 tables = 8 guests/table)
-        repr = np.repeat(np.arange(self.nr_tables), self.nr_guests // self.nr_tables)
+        # Make array with the index of the tables from 0 to nr_tables - 1
+        # Repeat each table by its nº of guests (its capacity)
+        repr = np.repeat(np.arange(self.nr_tables), self.problem.capacities)
 
         # Shuffle the array so the table assignments are random
-        np.random.shuffle(repr)
+        as_generator(rng).shuffle(repr)
 
         return repr
     
@@ -82,24 +667,191 @@ class SASolution():
         Calculates the fitness of the current seating arrangement.
         The fitness is the total sum of relationship scores for all guest pairs seated at the same table.
 
+        The value is cached and only recomputed after a new repr is assigned, so selection, 
+        elitism and logging can call this method repeatedly at no extra cost. 
+        Note that editing self.repr in place does not invalidate the cache; assign a new array instead.
+
         Returns:
         - fitness (int): The total happiness score of the current arrangement.
         """
-        
-        total_fitness = 0
 
-        for table in range(self.nr_tables):
+        if self._fitness is None:
+            self._fitness = self.problem.fitness(self.repr)
 
-            # Get all guests assigned to the current table
-            guests_at_table = np.where(self.repr == table)[0]
+        return self._fitness
+
+    @property
+    def affinity(self) -> np.ndarray:
+        """
+        Affinity of each guest to every table: [g][t] is the sum of the relationship scores 
+        between guest g and the guests seated at table t.
+
+        Built on first use in O(nr_guests^2) and then kept up to date by swap() in O(nr_guests).
+        """
+
+        if self._affinity is None:
+            self._affinity = self.problem.affinity(self.repr)
+
+        return self._affinity
+
+    def swap_delta(self, guest1: int, guest2: int):
+        """
+        Calculates the fitness change of swapping the tables of two guests, without applying it.
+
+        It is O(1) when the affinity matrix is already built and O(nr_guests) otherwise 
+        (O(relationships of the two guests) for sparse problems).
+
+        Parameters:
+            guest1 (int): Index of the first guest.
+            guest2 (int): Index of the second guest.
+
+        Returns:
+            The fitness change of the swap (0 if both guests are at the same table).
+        """
+
+        table1, table2 = self.repr[guest1], self.repr[guest2]
+
+        if table1 == table2:
+            return 0
+
+        if self._affinity is not None:
+            affinity1 = self._affinity[guest1]
+            affinity2 = self._affinity[guest2]
+            gain1 = affinity1[table2] - affinity1[table1]
+            gain2 = affinity2[table1] - affinity2[table2]
+        else:
+            # Weights of each guest with the guests at the two tables
+            guests1, weights1 = self.problem.neighbours(guest1)
+            guests2, weights2 = self.problem.neighbours(guest2)
+            gain1 = weights1 @ (self.repr[guests1] == table2) - weights1 @ (self.repr[guests1] == table1)
+            gain2 = weights2 @ (self.repr[guests2] == table1) - weights2 @ (self.repr[guests2] == table2)
+
+        # Each guest's gain counts the other as still seated at its new table
+        return self.problem.score(gain1 + gain2 - 2 * self.problem.pair_weight(guest1, guest2))
+
+    def swap_deltas(self, guest1: int) -> np.ndarray:
+        """
+        Calculates the fitness change of swapping the table of a guest with each other guest, 
+        all at once from the affinity matrix (which is built if needed).
+
+        Parameters:
+            guest1 (int): Index of the guest.
+
+        Returns:
+            np.ndarray: The fitness change of each swap, 0 for guests at the same table.
+        """
+
+        affinity = self.affinity
+        table1 = self.repr[guest1]
+        guests = np.arange(self.nr_guests)
+
+        gain1 = affinity[guest1, self.repr] - affinity[guest1, table1]
+        gain2 = affinity[:, table1] - affinity[guests, self.repr]
+        guests1, weights1 = self.problem.neighbours(guest1)
+        deltas = gain1 + gain2
+        deltas[guests1] -= 2 * weights1
+
+        return self.problem.score(np.where(self.repr != table1, deltas, 0))
+
+    def swap(self, guest1: int, guest2: int):
+        """
+        Swaps the tables of two guests in place, updating the cached fitness with the swap delta
+        and the affinity matrix in O(nr_guests) (O(relationships of the two guests) for sparse 
+        problems) instead of recomputing them.
+
+        Parameters:
+            guest1 (int): Index of the first guest.
+            guest2 (int): Index of the second guest.
+        """
+
+        table1, table2 = self.repr[guest1], self.repr[guest2]
+
+        if table1 == table2:
+            return
+
+        if self._fitness is not None:
+            self._fitness = self._fitness + self.swap_delta(guest1, guest2)
+
+        if self._affinity is not None and self.problem.sparse:
+            # Only the affinities of the guests related to guest1 or guest2 change
+            guests1, weights1 = self.problem.neighbours(guest1)
+            guests2, weights2 = self.problem.neighbours(guest2)
+            np.subtract.at(self._affinity, (guests1, table1), weights1)
+            np.add.at(self._affinity, (guests1, table2), weights1)
+            np.subtract.at(self._affinity, (guests2, table2), weights2)
+            np.add.at(self._affinity, (guests2, table1), weights2)
+        elif self._affinity is not None:
+            # Guest1 leaves table1 for table2 and guest2 does the opposite
+            weights = self.problem.weights
+            moved = weights[guest1] - weights[guest2]
+            self._affinity[:, table1] -= moved
+            self._affinity[:, table2] += moved
+
+        self._repr[guest1], self._repr[guest2] = table2, table1
+
+    @classmethod
+    def from_validated(cls, relations_mtx: np.ndarray | SAProblem, repr: np.ndarray, fitness = None) -> "SASolution":
+        """
+        Creates a solution from a representation that is already known to be valid, 
+        skipping validation. Used to create lightweight views over population rows.
+
+        Parameters:
+            relations_mtx (np.ndarray | SAProblem): Pairwise relationship scores or the problem owning them.
+            repr (np.ndarray): A valid seating arrangement.
+            fitness: Known fitness of the arrangement, if any.
+
+        Returns:
+            SASolution: The solution.
+        """
+
+        solution = cls.__new__(cls)
+        solution.problem = SAProblem.of(relations_mtx)
+        solution.nr_tables = solution.problem.nr_tables
+        solution.nr_guests = solution.problem.nr_guests
+        solution.repr = repr
+        solution._fitness = fitness
+
+        return solution
+
+    def derived_fitness(self, repr: np.ndarray):
+        """
+        Derives the fitness of a child representation from the cached fitness of this solution,
+        when the child is this arrangement itself or this arrangement with the tables of two 
+        guests swapped (e.g. replication followed by a swap based mutation).
+
+        Parameters:
+            repr (np.ndarray): The child representation.
+
+        Returns:
+            The child fitness, or None if it cannot be derived and must be computed.
+        """
+
+        if self._fitness is None:
+            return None
+
+        changed = np.flatnonzero(repr != self.repr)
+
+        if len(changed) == 0:
+            return self._fitness
+
+        if len(changed) == 2:
+            guest1, guest2 = changed
+            if repr[guest1] == self.repr[guest2] and repr[guest2] == self.repr[guest1]:
+                return self._fitness + self.swap_delta(guest1, guest2)
+
+        return None
+
+    def __deepcopy__(self, memo: dict) -> "SASolution":
+        """
+        Copies the arrangement and its cached values but keeps the reference to the shared problem.
+        """
 
-            # Sum the relationship scores for all unique pairs at this table
-            for i in range(len(guests_at_table)):
+        solution = SASolution.from_validated(self.problem, self.repr.copy(), self._fitness)
 
-                for j in range(i + 1, len(guests_at_table)):
-                    total_fitness += self.relations_mtx[guests_at_table[i], guests_at_table[j]]
+        if self._affinity is not None:
+            solution._affinity = self._affinity.copy()
 
-        return total_fitness
+        return solution
 
     def __str__(self):
         """
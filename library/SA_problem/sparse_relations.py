@@ -0,0 +1,304 @@
+# Group Members - Group P
+# Joana Esteves | 20240746 
+# Matilde Miguel | 20240549 
+# Tomás Figueiredo | 20240941 
+# Rita Serra | 20240515
+
+# General
+import numpy as np
+
+# Files
+import os
+
+class SparseRelations():
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, nr_guests: int):
+        """
+        Relationship scores stored as a compressed sparse row (CSR) matrix: only the pairs with a
+        non-zero score are kept, so memory grows with the number of relationships instead of
+        with the number of guests squared.
+
+        The scores of guest g are data[indptr[g]:indptr[g + 1]], with the other guests in
+        indices[indptr[g]:indptr[g + 1]] in increasing order. [g][other] has the same meaning
+        as relations_mtx[g][other] in the dense matrix.
+
+        Build it with from_dense, from_pairs, from_adjacency or from_scipy rather than from the arrays.
+
+        Parameters:
+            indptr (np.ndarray): nr_guests + 1 offsets of the scores of each guest.
+            indices (np.ndarray): The other guest of each score, sorted within each guest.
+            data (np.ndarray): The non-zero scores.
+            nr_guests (int): Number of guests.
+        """
+
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = (nr_guests, nr_guests)
+
+        self._row_ids = None
+        self._transpose = None
+
+    @classmethod
+    def from_pairs(cls, nr_guests: int, guests1: np.ndarray, guests2: np.ndarray, scores: np.ndarray) -> "SparseRelations":
+        """
+        Builds the relations from a list of (guest1, guest2, score) entries, as in [guest1][guest2]
+        of the dense matrix. Repeated entries add up and zero scores are dropped.
+
+        Parameters:
+            nr_guests (int): Number of guests.
+            guests1 (np.ndarray): First guest of each entry.
+            guests2 (np.ndarray): Second guest of each entry.
+            scores (np.ndarray): Score of each entry.
+
+        Returns:
+            SparseRelations: The relations.
+        """
+
+        guests1 = np.asarray(guests1, dtype=np.intp)
+        guests2 = np.asarray(guests2, dtype=np.intp)
+        scores = np.asarray(scores)
+
+        if np.any((guests1 < 0) | (guests1 >= nr_guests) | (guests2 < 0) | (guests2 >= nr_guests)):
+            raise ValueError(f"Guests must be between 0 and {nr_guests - 1}.")
+
+        # Sort by guest, then other guest, and add up the repeated entries
+        keys = guests1 * nr_guests + guests2
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+
+        is_first = np.r_[True, keys[1:] != keys[:-1]]
+        keys = keys[is_first]
+        scores = np.add.reduceat(scores[order], np.flatnonzero(is_first)) if len(order) else scores[order]
+
+        non_zero = scores != 0
+        keys, scores = keys[non_zero], scores[non_zero]
+
+        indptr = np.r_[0, np.cumsum(np.bincount(keys // nr_guests, minlength=nr_guests))]
+
+        return cls(indptr, keys % nr_guests, scores, nr_guests)
+
+    @classmethod
+    def from_dense(cls, relations_mtx: np.ndarray) -> "SparseRelations":
+        """
+        Builds the relations from the non-zero entries of a dense relationship matrix.
+        """
+
+        relations_mtx = np.asarray(relations_mtx)
+        guests1, guests2 = np.nonzero(relations_mtx)
+
+        return cls.from_pairs(len(relations_mtx), guests1, guests2, relations_mtx[guests1, guests2])
+
+    @classmethod
+    def from_adjacency(cls, adjacency: list) -> "SparseRelations":
+        """
+        Builds the relations from adjacency lists: for each guest, a dict {other guest: score}
+        or a list of (other guest, score) pairs with its non-zero scores.
+
+        Parameters:
+            adjacency (list): The adjacency list of every guest, one per guest.
+
+        Returns:
+            SparseRelations: The relations.
+        """
+
+        entries = [
+            (guest, other, score)
+            for guest, neighbours in enumerate(adjacency)
+            for other, score in (neighbours.items() if hasattr(neighbours, "items") else neighbours)
+        ]
+
+        guests1, guests2, scores = zip(*entries) if entries else ((), (), ())
+
+        return cls.from_pairs(len(adjacency), guests1, guests2, np.array(scores))
+
+    @classmethod
+    def from_scipy(cls, matrix) -> "SparseRelations":
+        """
+        Builds the relations from a square scipy.sparse matrix or array, in any format.
+        Only its tocoo() method is used, so scipy is not needed for anything else.
+        """
+
+        coo = matrix.tocoo()
+
+        if coo.shape[0] != coo.shape[1]:
+            raise ValueError("The relationship matrix must be square.")
+
+        return cls.from_pairs(coo.shape[0], coo.row, coo.col, coo.data)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.data.dtype
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    @property
+    def row_ids(self) -> np.ndarray:
+        """
+        Guest of every stored score, the row counterpart of indices.
+        """
+
+        if self._row_ids is None:
+            self._row_ids = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+        return self._row_ids
+
+    @property
+    def T(self) -> "SparseRelations":
+        """
+        Transposed relations ([other][g] = [g][other]), built on first use and kept.
+        """
+
+        if self._transpose is None:
+            self._transpose = SparseRelations.from_pairs(self.shape[0], self.indices, self.row_ids, self.data)
+
+        return self._transpose
+
+    def triu(self, k: int = 1) -> "SparseRelations":
+        """
+        Upper triangle of the relations, keeping [g][other] with other >= g + k.
+        """
+
+        keep = self.indices - self.row_ids >= k
+
+        return SparseRelations.from_pairs(self.shape[0], self.row_ids[keep], self.indices[keep], self.data[keep])
+
+    def symmetric(self) -> "SparseRelations":
+        """
+        The relations plus their transpose, e.g. the symmetric weights of an upper triangle.
+        """
+
+        return SparseRelations.from_pairs(self.shape[0], np.r_[self.row_ids, self.indices],
+                                          np.r_[self.indices, self.row_ids], np.r_[self.data, self.data])
+
+    def astype(self, dtype) -> "SparseRelations":
+        return SparseRelations(self.indptr, self.indices, self.data.astype(dtype), self.shape[0])
+
+    def row(self, guest: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        The guests a guest has a non-zero score with and the scores, in O(1) (views of the arrays).
+        """
+
+        start, end = self.indptr[guest], self.indptr[guest + 1]
+
+        return self.indices[start:end], self.data[start:end]
+
+    def get(self, guest1: int, guest2: int):
+        """
+        Score [guest1][guest2], 0 if the pair has no relationship. O(log(relationships of guest1)).
+        """
+
+        others, scores = self.row(guest1)
+        position = np.searchsorted(others, guest2)
+
+        if position < len(others) and others[position] == guest2:
+            return scores[position]
+
+        return self.dtype.type(0)
+
+    def sum_rows(self, guests: np.ndarray) -> np.ndarray:
+        """
+        Sum of the rows of some guests as a dense vector, e.g. the dense row of a guest with [guest],
+        in O(nr_guests + relationships of those guests).
+
+        Parameters:
+            guests (np.ndarray): The guests.
+
+        Returns:
+            np.ndarray: A nr_guests vector with the type of the scores.
+        """
+
+        guests = np.asarray(guests, dtype=np.intp)
+        starts = self.indptr[guests]
+        counts = self.indptr[guests + 1] - starts
+
+        # Positions of the scores of every guest, concatenated
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+
+        return np.bincount(self.indices[positions], weights=self.data[positions], minlength=self.shape[0]).astype(self.dtype)
+
+    def diagonal(self) -> np.ndarray:
+        on_diagonal = self.indices == self.row_ids
+
+        diagonal = np.zeros(self.shape[0], dtype=self.dtype)
+        diagonal[self.row_ids[on_diagonal]] = self.data[on_diagonal]
+
+        return diagonal
+
+    def table_sums(self, repr: np.ndarray, nr_tables: int) -> np.ndarray:
+        """
+        Sum of the scores of every guest with the guests of every table, in O(relationships + nr_guests * nr_tables).
+
+        Parameters:
+            repr (np.ndarray): Array where each index represents a guest and the value is its table.
+            nr_tables (int): Number of tables.
+
+        Returns:
+            np.ndarray: A (nr_guests, nr_tables) matrix where [g][t] is the sum of [g][other] over the
+            guests at table t (including g itself).
+        """
+
+        cells = self.row_ids * nr_tables + np.asarray(repr, dtype=np.intp)[self.indices]
+        sums = np.bincount(cells, weights=self.data, minlength=self.shape[0] * nr_tables)
+
+        return sums.reshape(self.shape[0], nr_tables).astype(self.dtype)
+
+    def same_table_sums(self, repr: np.ndarray) -> np.ndarray:
+        """
+        Sum of the scores of every guest with the guests at its own table (including itself), in O(relationships).
+        """
+
+        same_table = repr[self.row_ids] == repr[self.indices]
+
+        return np.bincount(self.row_ids[same_table], weights=self.data[same_table], minlength=self.shape[0]).astype(self.dtype)
+
+    def same_table_total(self, reprs: np.ndarray) -> np.ndarray:
+        """
+        Sum of all the scores between guests at the same table, for a block of arrangements,
+        in O(relationships) per arrangement. Rows are processed in chunks to bound the memory.
+
+        Parameters:
+            reprs (np.ndarray): A (nr_solutions, nr_guests) array, one arrangement per row.
+
+        Returns:
+            np.ndarray: The sum of each arrangement as floats.
+        """
+
+        totals = np.empty(len(reprs))
+        chunk = max(1, 2**22 // max(1, self.nnz))
+        data = self.data.astype(float)
+
+        for start in range(0, len(reprs), chunk):
+            block = reprs[start:start + chunk]
+            totals[start:start + chunk] = (block[:, self.row_ids] == block[:, self.indices]) @ data
+
+        return totals
+
+    def toarray(self) -> np.ndarray:
+        dense = np.zeros(self.shape, dtype=self.dtype)
+        dense[self.row_ids, self.indices] = self.data
+
+        return dense
+
+    def save(self, path: str):
+        """
+        Saves the arrays to a directory, to be loaded (e.g. memory-mapped) with load().
+        """
+
+        os.makedirs(path, exist_ok=True)
+
+        for name in ("indptr", "indices", "data"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str | None = None) -> "SparseRelations":
+        indptr, indices, data = (np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+                                 for name in ("indptr", "indices", "data"))
+
+        return cls(indptr, indices, data, len(indptr) - 1)
+
+    def __reduce__(self):
+        # The cached row ids and transpose are rebuilt on demand
+        return (SparseRelations, (self.indptr, self.indices, self.data, self.shape[0]))
@@ -7,49 +7,162 @@
 # General 
 import numpy as np
 from typing import Callable
-from copy import deepcopy
-import random
+import heapq
+import time
 
 # Seating arrangement problme 
-from library.SA_problem.seating_arrangement import SASolution
+from library.SA_problem.seating_arrangement import SAProblem, SASolution, FitnessCache, as_generator, canonical_keys
 
-def get_best_individuals(population: list[SASolution], n_ind: int):
+# Population
+from .population import Population, duplicate_mask
+
+# Selection
+from .selection import batched_selection
+
+# Crossover
+from .crossover import batched_crossover
+
+# Profiling
+from .profiling import PhaseProfiler, NULL_PROFILER
+
+def get_best_individuals(population: Population | list[SASolution], n_ind: int):
     """
-    Calculates the fitness of each individual in the population and 
-    selects the individuals with the highest fitness.
+    Selects the individuals with the highest fitness, using the cached fitness values and a 
+    partial selection instead of sorting the whole population.
 
     Args:
-        population (list[Solution]): A list of Solution objects representing the population.
+        population (Population | list[Solution]): The population, as a Population or a list of Solution objects.
 
     Returns:
         Solutions: The n individuals with best fitness in the population.
     """
 
-    fitness_list = [ind.fitness() for ind in population]
+    # Batched best-k query on the population matrix
+    if isinstance(population, Population):
+        return [population[idx] for idx in population.best(n_ind)]
+
+    # Partial selection of the n best (cached) fitness values, in the same order as a stable sort
+    return heapq.nlargest(n_ind, population, key=lambda ind: ind.fitness())
+
+def initialize_population(relations_mtx: np.ndarray | SAProblem, pop_size: int, rng: np.random.Generator | None = None) -> Population:
+    return Population.random(relations_mtx, pop_size, rng)
+
+def termination_reason(
+    best_fitness_per_gen: list,
+    population: Population,
+    elapsed: float,
+    evaluations: int,
+    stagnation_window: int | None = None,
+    target_fitness: float | None = None,
+    time_budget: float | None = None,
+    max_evaluations: int | None = None,
+    min_diversity: float | None = None
+) -> str | None:
+    """
+    Checks the termination criteria of a run after a generation. Criteria set to None are not checked.
+
+    Parameters:
+        best_fitness_per_gen (list): Best fitness in each generation so far.
+        population (Population): The current population.
+        elapsed (float): Seconds since the start of the run.
+        evaluations (int): Fitness evaluations made so far.
+        Remaining parameters are the criteria of genetic_algorithm.
+
+    Returns:
+        str | None: Name of the first criterion met, or None to keep evolving.
+    """
+
+    if target_fitness is not None and best_fitness_per_gen[-1] >= target_fitness:
+        return "target_fitness"
 
-    # Pair each individual with the corresponding idx
-    paired = list(zip(population, fitness_list))
+    # No new best in the last stagnation_window generations
+    if stagnation_window is not None and len(best_fitness_per_gen) > stagnation_window:
+        if max(best_fitness_per_gen[-stagnation_window:]) <= max(best_fitness_per_gen[:-stagnation_window]):
+            return "stagnation"
 
-    # Order by fitness
-    # Reverse to get descending order
-    paired_sorted = sorted(paired, key=lambda x: x[1], reverse=True)
+    if time_budget is not None and elapsed >= time_budget:
+        return "time_budget"
 
-    # Get n best individuals
-    best_individuals = [ind for ind, _ in paired_sorted[:n_ind]]
+    if max_evaluations is not None and evaluations >= max_evaluations:
+        return "max_evaluations"
 
-    return best_individuals
+    if min_diversity is not None and population.diversity() < min_diversity:
+        return "min_diversity"
+
+    return None
+
+# Supported ways of replacing duplicate individuals
+DEDUPLICATION_MODES = ("mutate", "replace")
+
+def replace_duplicates(problem: SAProblem, reprs: np.ndarray, fitness: np.ndarray, duplicates: np.ndarray, mode: str,
+                       mutation_function: Callable, rng: np.random.Generator, max_tries: int = 3) -> int:
+    """
+    Replaces in place the duplicate individuals of a new population (see duplicate_mask) with new arrangements,
+    whose fitness becomes unknown.
+
+    Parameters:
+        problem (SAProblem): The problem.
+        reprs (np.ndarray): (pop_size, nr_guests) representations of the new population.
+        fitness (np.ndarray): Fitness of the new population, NaN when unknown.
+        duplicates (np.ndarray): Boolean mask of the individuals to replace.
+        mode (str): "mutate" mutates each duplicate again until it is new (up to max_tries times, then 
+            it is replaced by a random arrangement), "replace" replaces it by a random arrangement.
+        mutation_function (Callable): Mutation used by the "mutate" mode.
+        rng (np.random.Generator): Random generator to draw from.
+        max_tries (int): Maximum number of mutations of a duplicate. Defaults to 3.
+
+    Returns:
+        int: Number of duplicates replaced by a random arrangement.
+    """
+
+    # Canonical forms of the individuals that are kept
+    seen = set(key for key, duplicate in zip(canonical_keys(reprs), duplicates) if not duplicate)
+    tables = np.repeat(np.arange(problem.nr_tables), problem.capacities)
+    nr_random = 0
+
+    for idx in np.flatnonzero(duplicates):
+        candidate, key = reprs[idx], None
+
+        if mode == "mutate":
+            for _ in range(max_tries):
+                candidate = mutation_function(candidate, problem.relations_mtx, rng=rng)
+                key = canonical_keys(candidate[None, :])[0]
+                if key not in seen:
+                    break
+
+        if key is None or key in seen:
+            candidate = rng.permutation(tables)
+            key = canonical_keys(candidate[None, :])[0]
+            nr_random += 1
+
+        reprs[idx] = candidate
+        fitness[idx] = np.nan
+        seen.add(key)
+
+    return nr_random
+
+def evaluate_population(population: Population, evaluator: Callable | None = None, cache: FitnessCache | None = None) -> int:
+    """
+    Scores the individuals of a population whose fitness is unknown.
+
+    Parameters:
+        population (Population): The population.
+        evaluator (Callable | None): Fitness evaluator (problem, reprs) -> fitness. Defaults to the batch fitness.
+        cache (FitnessCache | None): Fitness cache of the run, if any. Defaults to None.
+
+    Returns:
+        int: Number of fitness evaluations made, without the individuals found in the fitness cache.
+    """
 
-def initialize_population(relations_mtx, pop_size):
-    population = []
+    misses = None if cache is None else cache.misses
+    unknown = np.count_nonzero(np.isnan(population.fitness))
 
-    for _ in range(pop_size):
-        solution = SASolution(relations_mtx)
-        population.append(solution)
+    population.evaluate(evaluator, cache)
 
-    return population
+    return unknown if cache is None else cache.misses - misses
 
 def genetic_algorithm(
-    relations_mtx: np.ndarray,
+    relations_mtx: np.ndarray | SAProblem,
     pop_size: int,
     max_gen: int,
     selection_algorithm: Callable,
@@ -58,13 +171,31 @@ def genetic_algorithm(
     xo_prob: float = 0.9,
     mut_prob: float = 0.2,
     elitism: int = 1,
-    verbose: bool = False
+    verbose: bool = False,
+    initial_population: Population | np.ndarray | None = None,
+    return_info: bool = False,
+    local_search: Callable | None = None,
+    local_search_k: int = 1,
+    local_search_budget: int = 1000,
+    evaluator: Callable | None = None,
+    cache_size: int | None = None,
+    deduplicate: str | None = None,
+    diversity_sample: int = 32,
+    profile: bool = False,
+    stagnation_window: int | None = None,
+    target_fitness: float | None = None,
+    time_budget: float | None = None,
+    max_evaluations: int | None = None,
+    min_diversity: float | None = None,
+    rng: np.random.Generator | int | None = None
 ):
     """
     Executes a genetic algorithm to optimize a population of solutions.
 
     Parameters:
-        initial_population (list[Solution]): The starting population of solutions.
+        relations_mtx (np.ndarray | SAProblem): Relationship score matrix used to calculate the fitness,
+            or the problem instance owning it (e.g. a shared one in worker processes).
+        pop_size (int): Number of individuals in the population.
         max_gen (int): The maximum number of generations to evolve.
         selection_algorithm (Callable): Function used for selecting individuals.
         mutation_function (Callable): Function used to apply mutation.
@@ -73,88 +204,258 @@ def genetic_algorithm(
         mut_prob (float): Probability of applying mutation. Defaults to 0.2.
         elitism (int): Carries nr of elits, if 0 no elitism is applied. Defaults to 1.
         verbose (bool): If True, prints detailed logs for debugging. Defaults to False.
+        initial_population (Population | np.ndarray | None): Population to start from, e.g. to continue 
+            a previous run, as a Population or a (pop_size, nr_guests) array. Defaults to a random population.
+        return_info (bool): If True, also returns a dictionary with information about the run. Defaults to False.
+        local_search (Callable | None): Local search applied in place to the best individuals of each new 
+            population (e.g. first_improvement_local_search), if any. Defaults to None.
+        local_search_k (int): Number of best individuals improved by the local search. Defaults to 1.
+        local_search_budget (int): Maximum number of swaps scored by each local search call. Defaults to 1000.
+        evaluator (Callable | None): Fitness evaluator (problem, reprs) -> fitness, called once per generation 
+            on all new individuals whose fitness is unknown, e.g. a ThreadPoolEvaluator (see evaluation.py). 
+            Defaults to the vectorized batch fitness.
+        cache_size (int | None): If given, the population evaluations of the run go through a fitness cache of 
+            this many arrangements (see FitnessCache). The cache lives only for this run, so runs on the same 
+            matrix never share fitness values or counters. Defaults to None.
+        deduplicate (str | None): If given, the individuals of each new population that seat the same groups 
+            as an earlier one (elites first) are replaced before evaluation: "mutate" mutates them again, 
+            "replace" replaces them by random arrangements (see replace_duplicates). Defaults to None.
+        diversity_sample (int): Number of pairs of individuals sampled to estimate the diversity of each 
+            generation (see Population.sampled_diversity). Defaults to 32.
+        profile (bool): If True, times every phase of the run (see PhaseProfiler) and counts the fitness 
+            evaluations of every generation. When False, the instrumentation costs almost nothing. Defaults to False.
+        stagnation_window (int | None): Stops when the best fitness did not improve in this many generations. Defaults to None.
+        target_fitness (float | None): Stops when the best fitness reaches this value. Defaults to None.
+        time_budget (float | None): Stops after the generation that exceeds this many seconds. Defaults to None.
+        max_evaluations (int | None): Stops once this many fitness evaluations were made. Defaults to None.
+        min_diversity (float | None): Stops when the population diversity (see Population.diversity) 
+            falls below this value. Defaults to None.
+        rng (np.random.Generator | int | None): Random generator of the run, or a seed for a new one. All random 
+            choices of the run and its operators are drawn from it (operators receive it as the rng keyword), 
+            so a run is reproduced by passing the same seed. Defaults to a new unseeded generator.
 
     Returns:
-        Solution: The best solution found on the last population after evolving for max_gen generations.
+        Solution: The best solution found on the last population, after max_gen generations or when a 
+            termination criterion was met.
         List: List of fitness values from the best inidvidual in each generation.
+        dict (only if return_info): Information about the run:
+            - population (Population): The last population, which can be used to continue the run.
+            - local_search_evaluations (int): Number of swaps scored by the local search.
+            - stop_reason (str): Criterion that ended the run: "max_gen", "stagnation", "target_fitness", 
+              "time_budget", "max_evaluations" or "min_diversity".
+            - generations (int): Number of generations evolved.
+            - evaluations (int): Number of fitness evaluations, without the ones found in the fitness cache.
+            - cache (dict | None): Hit and miss counters of the fitness cache of the run (see FitnessCache.stats), if any.
+            - duplicate_rate (list[float]): Fraction of duplicates in each new population, before deduplication. 
+              Only tracked with deduplicate, empty otherwise.
+            - diversity (list[float]): Estimated pairwise diversity of each generation (see Population.sampled_diversity).
+            - profile (dict | None): If profile, the time and calls of every phase and the fitness evaluations of 
+              every generation (see PhaseProfiler.report): initialization, elitism, selection, crossover (including 
+              repair), mutation, fitness_inheritance (fitness of replicated offspring), deduplication, validation 
+              (building and validating the new population), evaluation, local_search and bookkeeping (best 
+              individual, diversity and termination criteria).
     """
 
-    # Initialize a population with N individuals
-    population = initialize_population(relations_mtx, pop_size)
+    start_time = time.time()
+    rng = as_generator(rng)
+
+    if deduplicate is not None and deduplicate not in DEDUPLICATION_MODES:
+        raise ValueError(f"Deduplication must be one of {DEDUPLICATION_MODES}.")
+
+    # The diversity samples are drawn from a child generator, so they do not change the random stream of the run
+    diversity_rng = rng.spawn(1)[0]
+
+    profiler = PhaseProfiler() if profile else NULL_PROFILER
+
+    # Batched variant of the selection algorithm, if there is one
+    batched_selector = batched_selection(selection_algorithm)
+
+    # Batched variant of the crossover operator, if there is one
+    batched_crossover_function = batched_crossover(crossover_function)
+
+    # Every individual references the same problem instance instead of its own matrix
+    problem = SAProblem.of(relations_mtx)
+    relations_mtx = problem.relations_mtx
+
+    # Fitness cache of this run only, the problem is shared by every run on the same matrix
+    cache = None if cache_size is None else FitnessCache(cache_size)
+
+    # Initialize a population with N individuals, or continue from the given one
+    with profiler.phase("initialization"):
+        if initial_population is None:
+            population = initialize_population(problem, pop_size, rng)
+        elif isinstance(initial_population, Population):
+            population = initial_population
+        else:
+            population = Population(problem, initial_population)
+
+    # The population size is the one of the given population
+    pop_size = len(population)
+
+    with profiler.phase("evaluation"):
+        evaluations = evaluate_population(population, evaluator, cache)
+    profiler.record_evaluations(evaluations)
 
     # Initialize list to save the fitness of the final best inidvidual per generation
     best_fitness_per_gen = []
+    local_search_evaluations = 0
+    stop_reason = "max_gen"
+    duplicate_rates = []
+    diversities = []
 
     # Repeat until termination condition
     for gen in range(1, max_gen + 1):
         if verbose:
             print(f'-------------- Generation: {gen} --------------')
 
-        # Create an empty population P'
-        new_population = []
+        # Create an empty population P' as a matrix of representations,
+        # with NaN for the fitness values that still need to be computed
+        new_reprs = np.empty_like(population.reprs)
+        new_fitness = np.full(pop_size, np.nan)
+        nr_new = 0
 
         # If using elitism, insert best n individuals from P into P'
         if elitism != 0:
-            best_individuals = get_best_individuals(population, elitism)
-            
-            for ind in best_individuals:
-                new_population.append(deepcopy(ind))
+            with profiler.phase("elitism"):
+                elite_idxs = population.best(elitism)
+                nr_new = len(elite_idxs)
+                new_reprs[:nr_new] = population.reprs[elite_idxs]
+                new_fitness[:nr_new] = population.fitness[elite_idxs]
         
-        # Repeat until P' contains N individuals
-        while len(new_population) < len(population):
+        # Select all pairs of parents needed to fill P' using a selection algorithm.
+        # Batched operators draw every parent at once from the fitness vector, and the 
+        # parents of all pairs are gathered into two (nr_pairs, nr_guests) blocks
+        nr_pairs = (pop_size - nr_new + 1) // 2
 
-            # Select two parents using a selection algorithm
-            first_ind = selection_algorithm(population)
-            second_ind = selection_algorithm(population)
+        with profiler.phase("selection"):
+            if batched_selector is not None:
+                parent_idxs = batched_selector(population.fitness, 2 * nr_pairs, rng=rng).reshape(nr_pairs, 2)
+                parents1 = population.reprs[parent_idxs[:, 0]]
+                parents2 = population.reprs[parent_idxs[:, 1]]
+                parents_fitness = population.fitness[parent_idxs]
+            else:
+                selected = [(selection_algorithm(population, rng=rng), selection_algorithm(population, rng=rng)) for _ in range(nr_pairs)]
+                parents1 = np.array([first_ind.repr for first_ind, _ in selected])
+                parents2 = np.array([second_ind.repr for _, second_ind in selected])
+                parents_fitness = np.array([[first_ind.fitness(), second_ind.fitness()] for first_ind, second_ind in selected], dtype=float)
 
-            if verbose:
-                print(f'Selected individuals:\n{first_ind}\n{second_ind}')
+        # Apply crossover with probability, to all the selected pairs at once when 
+        # the operator has a batched variant. The other pairs are replicated.
+        # The profiler is activated so the repair inside the operators is timed too
+        with profiler.phase("crossover"), profiler.activate():
+            crossed = rng.random(nr_pairs) < xo_prob
+            offspring1, offspring2 = parents1.copy(), parents2.copy()
 
-            # Apply crossover with probability
-            if random.random() < xo_prob:
-                offspring1_repr, offspring2_repr = crossover_function(first_ind.repr, second_ind.repr)
-                if verbose:
-                    print(f'Applied crossover')
-            else:
-                offspring1_repr, offspring2_repr = deepcopy(first_ind.repr), deepcopy(second_ind.repr)
-                if verbose:
-                    print(f'Applied replication')
-            
-            # Apply mutation with probability
-            if random.random() < mut_prob:
-                first_new_ind_repr = mutation_function(offspring1_repr, relations_mtx)
-                second_new_ind_repr = mutation_function(offspring2_repr, relations_mtx)
-            else:
-                first_new_ind_repr = deepcopy(offspring1_repr)
-                second_new_ind_repr = deepcopy(offspring2_repr)
-            
-            first_new_ind = SASolution(relations_mtx, first_new_ind_repr)
+            if np.any(crossed):
+                if batched_crossover_function is not None:
+                    offspring1[crossed], offspring2[crossed] = batched_crossover_function(parents1[crossed], parents2[crossed], rng=rng)
+                else:
+                    for pair in np.flatnonzero(crossed):
+                        offspring1[pair], offspring2[pair] = crossover_function(parents1[pair], parents2[pair], rng=rng)
 
-            # Insert first individual into P'
-            new_population.append(first_new_ind)
+        if verbose:
+            print(f'Applied crossover to {np.count_nonzero(crossed)} pairs and replication to {np.count_nonzero(~crossed)} pairs')
 
-            if verbose:
-                print(f'First individual: {first_new_ind}')
-            
-            # Insert second individual into P' if population is not yet completed
-            if len(new_population) < len(population):
-                second_new_ind = SASolution(relations_mtx, second_new_ind_repr)
-                new_population.append(second_new_ind)
-
-                if verbose:
-                    print(f'Second individual: {first_new_ind}')
-        
-        # Replace P with P'
-        population = new_population
+        # Apply mutation with probability, to both offspring of a pair
+        with profiler.phase("mutation"):
+            mutated = rng.random(nr_pairs) < mut_prob
 
-        # Get the best individual from P in current generation
-        final_best = get_best_individuals(population, 1)[0]
+            for pair in np.flatnonzero(mutated):
+                offspring1[pair] = mutation_function(offspring1[pair], relations_mtx, rng=rng)
+                offspring2[pair] = mutation_function(offspring2[pair], relations_mtx, rng=rng)
 
-        # Save fiteness of best individual from P in current generation
-        best_fitness_per_gen.append(final_best.fitness())
+        if verbose:
+            print(f'Applied mutation to {np.count_nonzero(mutated)} pairs')
+
+        # Replicated offspring keep the parent fitness, or get it as the parent fitness 
+        # plus the swap delta if they were mutated
+        with profiler.phase("fitness_inheritance"):
+            offspring_fitness = np.full((nr_pairs, 2), np.nan)
+            offspring_fitness[~crossed] = parents_fitness[~crossed]
+
+            for pair in np.flatnonzero(~crossed & mutated):
+                for side, (parent, offspring) in enumerate(((parents1, offspring1), (parents2, offspring2))):
+                    if np.isnan(parents_fitness[pair, side]):
+                        continue
+                    parent_ind = SASolution.from_validated(problem, parent[pair], problem.score(parents_fitness[pair, side]))
+                    fitness = parent_ind.derived_fitness(offspring[pair])
+                    offspring_fitness[pair, side] = np.nan if fitness is None else fitness
+
+        # Insert the offspring of each pair into P', the second one of the last pair 
+        # only if the population is not yet completed
+        nr_offspring = pop_size - nr_new
+        new_reprs[nr_new:] = np.stack((offspring1, offspring2), axis=1).reshape(-1, offspring1.shape[1])[:nr_offspring]
+        new_fitness[nr_new:] = offspring_fitness.reshape(-1)[:nr_offspring]
+
+        # Individuals of P' that seat the same groups as an earlier one, replaced if deduplicating.
+        # Finding them costs a canonical form per individual, so it is skipped when not deduplicating
+        if deduplicate is not None:
+            with profiler.phase("deduplication"):
+                duplicates = duplicate_mask(new_reprs)
+                duplicate_rates.append(np.count_nonzero(duplicates) / pop_size)
+
+                if np.any(duplicates):
+                    nr_random = replace_duplicates(problem, new_reprs, new_fitness, duplicates, deduplicate, mutation_function, rng)
+
+            if verbose and np.any(duplicates):
+                print(f'Replaced {np.count_nonzero(duplicates)} duplicates ({nr_random} by random arrangements)')
+
+        # Replace P with P', validating and scoring all new individuals in batch
+        with profiler.phase("validation"):
+            population = Population(problem, new_reprs, new_fitness)
+
+        with profiler.phase("evaluation"):
+            generation_evaluations = evaluate_population(population, evaluator, cache)
+
+        evaluations += generation_evaluations
+        profiler.record_evaluations(generation_evaluations)
+
+        # Improve the best individuals of P in place with the local search, if any
+        if local_search is not None:
+            with profiler.phase("local_search"):
+                for idx in population.best(local_search_k):
+                    individual = population[idx]
+                    local_search_evaluations += local_search(individual, local_search_budget, rng=rng)
+                    population.fitness[idx] = individual.fitness()
+
+        with profiler.phase("bookkeeping"):
+            # Get the best individual from P in current generation
+            final_best = get_best_individuals(population, 1)[0]
+
+            # Save fiteness of best individual from P in current generation
+            best_fitness_per_gen.append(final_best.fitness())
+            diversities.append(population.sampled_diversity(diversity_sample, diversity_rng))
+
+            # Stop early if a termination criterion is met
+            reason = termination_reason(
+                best_fitness_per_gen, population, time.time() - start_time, evaluations,
+                stagnation_window, target_fitness, time_budget, max_evaluations, min_diversity
+            )
 
         if verbose:
             print(f'Final best individual in generation: {final_best}')
+            if duplicate_rates:
+                print(f'Duplicate rate: {duplicate_rates[-1]:.3f}')
+            print(f'Diversity: {diversities[-1]:.3f}')
+
+        if reason is not None:
+            stop_reason = reason
+            if verbose:
+                print(f'Stopped at generation {gen}: {stop_reason}')
+            break
 
     # Return the best individual in P
+    if return_info:
+        return final_best, best_fitness_per_gen, {
+            "population": population,
+            "local_search_evaluations": local_search_evaluations,
+            "stop_reason": stop_reason,
+            "generations": len(best_fitness_per_gen),
+            "evaluations": int(evaluations),
+            "cache": None if cache is None else cache.stats(),
+            "duplicate_rate": duplicate_rates,
+            "diversity": diversities,
+            "profile": profiler.report()
+        }
+
     return final_best, best_fitness_per_gen
@@ -5,90 +5,226 @@
 # Rita Serra | 20240515
 
 # General
-import random
 import numpy as np
-from collections import Counter
+from functools import partial
+from typing import Callable
 
-def repair_repr(arr: np.ndarray) -> np.ndarray:
+# Seating arrangement problem
+from library.SA_problem.seating_arrangement import as_generator
+
+# Profiling
+from .profiling import active_profiler
+
+def equal_capacities(reprs: np.ndarray) -> np.ndarray:
     """
-    Ensures that each table has exactly 8 guests by fixing duplicates and missing assignments.
+    Capacities of equal tables for representations given without their problem: as many tables as the 
+    highest table label needs, rounded up to a number of tables that divides the guests (8 for the 
+    64 guests of the wedding, unless a label above 7 appears).
 
     Parameters:
-    arr (np.ndarray): A 64-element array where each index represents a guest and the value 
-                        is the table number (0 to 7) to which the guest is assigned.
+        reprs (np.ndarray): A representation, or a (k, nr_guests) block of them.
 
     Returns:
-        np.ndarray: A repaired array with exactly 8 guests per table.
+        np.ndarray: The number of guests of each table.
     """
-    table_counts = Counter(arr)
-    missing = []
-    excess = []
 
-    # Identify which tables are under- or overrepresented
-    for table in range(8):
-        count = table_counts.get(table, 0)
-        if count < 8:
-            missing.extend([table] * (8 - count))
-        elif count > 8:
-            excess.extend([table] * (count - 8))
+    nr_guests = np.shape(reprs)[-1]
+    nr_tables = int(np.max(reprs)) + 1
+
+    while nr_guests % nr_tables != 0:
+        nr_tables += 1
+
+    return np.full(nr_tables, nr_guests // nr_tables)
+
+def repair_reprs(block: np.ndarray, capacities: np.ndarray | None = None, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Batched, vectorized repair of a (k, nr_guests) block of representations, so that each table 
+    has exactly its capacity of guests.
 
-    if len(missing) != len(excess):
+    Per row, the same genes as the original loop based repair are changed: going through the guests 
+    in order, the first guests of an over-represented table are moved to the missing tables, filling 
+    the highest missing table first.
+
+    Parameters:
+        block (np.ndarray): A (k, nr_guests) array, one representation per row.
+        capacities (np.ndarray | None): Number of guests of each table (e.g. SAProblem.capacities). Required 
+                                        for uneven tables, defaults to equal tables (see equal_capacities).
+        out (np.ndarray | None): Array to write the repaired block to, can be block itself to repair 
+                                 in place. Defaults to a new array.
+
+    Returns:
+        np.ndarray: The repaired block.
+    """
+
+    k, nr_guests = block.shape
+
+    if capacities is None:
+        capacities = equal_capacities(block)
+
+    nr_tables = len(capacities)
+
+    if out is None:
+        out = block.copy()
+    elif out is not block:
+        out[...] = block
+
+    # Guests per table of every row, counted at once by offsetting each row's table ids
+    tables = block.astype(np.intp)
+    counts = np.bincount((tables + np.arange(k)[:, None] * nr_tables).ravel(), minlength=k * nr_tables).reshape(k, nr_tables)
+
+    surplus = np.maximum(counts - capacities, 0)
+    deficit = np.maximum(capacities - counts, 0)
+
+    if np.any(surplus.sum(axis=1) != deficit.sum(axis=1)):
         raise ValueError("Mismatch in number of missing and excess table assignments.")
 
-    arr = arr.copy()
+    if not np.any(surplus):
+        return out
+
+    # Rank of each guest among the guests of its table, in guest order
+    order = np.argsort(tables, axis=1, kind="stable")
+    first_position = np.cumsum(counts, axis=1) - counts
+    sorted_tables = np.take_along_axis(tables, order, axis=1)
+    rank = np.empty_like(tables)
+    np.put_along_axis(rank, order, np.arange(nr_guests) - np.take_along_axis(first_position, sorted_tables, axis=1), axis=1)
+
+    # The first guests of each table beyond its capacity are reassigned
+    rows, guests = np.nonzero(rank < np.take_along_axis(surplus, tables, axis=1))
+
+    # Row by row, the missing tables from the highest to the lowest
+    replacements = np.repeat(np.tile(np.arange(nr_tables)[::-1], k), deficit[:, ::-1].ravel())
+    out[rows, guests] = replacements
+
+    return out
+
+def repair_repr(arr: np.ndarray, capacities: np.ndarray | None = None, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Ensures that each table has exactly its capacity of guests by fixing duplicates and missing assignments.
+
+    Parameters:
+    arr (np.ndarray): An array where each index represents a guest and the value 
+                        is the table number (0 to nr_tables - 1) to which the guest is assigned.
+    capacities (np.ndarray | None): Number of guests of each table (e.g. SAProblem.capacities). Required 
+                                    for uneven tables, defaults to equal tables (see equal_capacities).
+    out (np.ndarray | None): Array to write the repaired representation to, can be arr itself to repair 
+                             in place. Defaults to a new array.
+
+    Returns:
+        np.ndarray: A repaired array with exactly the capacity of each table in guests.
+    """
+
+    if out is None:
+        out = arr.copy()
+    elif out is not arr:
+        out[...] = arr
+
+    # A one-row block of the batched repair, in place, so no (nr_guests, nr_tables) matrix is built
+    block = out[None, :]
+    repair_reprs(block, capacities, out=block)
+
+    return out
+
+def parent_capacities(parents: np.ndarray) -> np.ndarray:
+    """
+    Table capacities of the problem, read from a valid parent: every valid arrangement seats 
+    exactly the capacity of each table, so the operators do not need the problem itself.
+    """
+
+    return np.bincount(parents.reshape(-1, parents.shape[-1])[0])
+
+def _repair_offspring(offspring1: np.ndarray, offspring2: np.ndarray, capacities: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Repair both offspring blocks in place, in a single batched call (timed when the run is profiled)
+    offspring = np.concatenate((offspring1, offspring2))
+
+    with active_profiler().phase("repair"):
+        repair_reprs(offspring, capacities, out=offspring)
+
+    return offspring[:len(offspring1)], offspring[len(offspring1):]
+
+def cycle_crossover_batch(parents1: np.ndarray, parents2: np.ndarray, rng: np.random.Generator | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Perform cycle crossover between k pairs of parents at once.
+
+    Starting at a random index of each pair, the cycle follows the first position in parent1 of the 
+    table parent2 holds at the current position, until an index is visited again. All rows step 
+    through their cycles together, using a precomputed index of the first position of every table.
 
-    # Replace excess table assignments with missing ones
-    for i in range(len(arr)):
-        if excess:
-            if table_counts[arr[i]] > 8:
-                replacement = missing.pop()
-                table_counts[arr[i]] -= 1
-                arr[i] = replacement
-                table_counts[replacement] += 1
+    Parameters:
+        parents1 (np.ndarray): A (k, nr_guests) block with the first parent of each pair
+        parents2 (np.ndarray): A (k, nr_guests) block with the second parent of each pair
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Two (k, nr_guests) blocks of repaired offspring, one per parent
+    """
+
+    k, nr_guests = parents1.shape
+    rows = np.arange(k)
+
+    # First position of each table in parent1, per row: the start of each table among 
+    # the positions sorted by table
+    capacities = parent_capacities(parents1)
+    first_position = np.argsort(parents1, axis=1, kind="stable")[:, np.cumsum(capacities) - capacities]
 
-    return arr
+    # Find the indices that belong to the cycle of each row
+    in_cycle = np.zeros((k, nr_guests), dtype=bool)
+    current_idx = as_generator(rng).integers(0, nr_guests, size=k)
+    active = np.ones(k, dtype=bool)
 
-def cycle_crossover(parent1:np.ndarray, parent2:np.ndarray)->tuple[np.ndarray, np.ndarray]:
+    while np.any(active):
+        in_cycle[rows[active], current_idx[active]] = True
+
+        # Find the next index in the cycle, rows stop once they get back to a visited index
+        current_idx = first_position[rows, parents2[rows, current_idx]]
+        active &= ~in_cycle[rows, current_idx]
+
+    offspring1 = np.where(in_cycle, parents1, parents2)
+    offspring2 = np.where(in_cycle, parents2, parents1)
+
+    return _repair_offspring(offspring1, offspring2, capacities)
+
+def cycle_crossover(parent1:np.ndarray, parent2:np.ndarray, rng: np.random.Generator | None = None)->tuple[np.ndarray, np.ndarray]:
     """
     Perform cycle crossover between two parents
 
     Parameters:
         parent1 (np.ndarray): The first parent representation
         parent2 (np.ndarray): The second parent representation
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
 
     Returns:
         tuple[np.ndarray, np.ndarray]: Two repaired offspring representations after performing the crossover
     """
 
-    initial_random_idx= random.randint(0, len(parent1) - 1)
+    offspring1, offspring2 = cycle_crossover_batch(parent1[None], parent2[None], rng)
 
-    # Find the indices that belong to the cycle
-    cycle_idxs= set()
-    current_cycle_idx= initial_random_idx
+    return offspring1[0], offspring2[0]
 
-    while current_cycle_idx not in cycle_idxs:
-        cycle_idxs.add(current_cycle_idx)
+def one_point_crossover_batch(parents1: np.ndarray, parents2: np.ndarray, rng: np.random.Generator | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Perform one-point crossover on k pairs of parents at once, with a random crossover point per pair.
 
-        # Find the next index in the cycle
-        value_parent2 = parent2[current_cycle_idx]
-        current_cycle_idx = np.where(parent1 == value_parent2)[0][0]
+    Parameters:
+        parents1 (np.ndarray): A (k, nr_guests) block with the first parent of each pair.
+        parents2 (np.ndarray): A (k, nr_guests) block with the second parent of each pair.
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Two (k, nr_guests) blocks of repaired offspring.
+    """
+
+    k, n = parents1.shape  # Number of pairs and of guests
 
-    # Create the empty offspring representations
-    offspring1_repr = np.empty_like(parent1)
-    offspring2_repr = np.empty_like(parent2)
+    c_points = as_generator(rng).integers(1, n, size=k)  # Random crossover point of each pair
 
-    
-    for idx in range(len(parent1)):
-        if idx in cycle_idxs:
-            offspring1_repr[idx] = parent1[idx]
-            offspring2_repr[idx] = parent2[idx]
-        else:
-            offspring1_repr[idx] = parent2[idx]
-            offspring2_repr[idx] = parent1[idx]
+    # Genes from the crossover point onwards are swapped
+    mask = np.arange(n) >= c_points[:, None]
+    offspring1 = np.where(mask, parents2, parents1)
+    offspring2 = np.where(mask, parents1, parents2)
 
-    return repair_repr(offspring1_repr), repair_repr(offspring2_repr)
+    return _repair_offspring(offspring1, offspring2, parent_capacities(parents1))
 
-def one_point_crossover(parent1: np.ndarray, parent2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+def one_point_crossover(parent1: np.ndarray, parent2: np.ndarray, rng: np.random.Generator | None = None) -> tuple[np.ndarray, np.ndarray]:
     """
     Perform one-point crossover on two parent representations, 
     where the crossover occurs at one single point.
@@ -96,45 +232,75 @@ def one_point_crossover(parent1: np.ndarray, parent2: np.ndarray) -> tuple[np.nd
     Parameters:
         parent1 (np.ndarray): The first parent representation.
         parent2 (np.ndarray): The second parent representation.
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
 
     Returns:
         tuple[np.ndarray, np.ndarray]: Two offspring representations after performing the crossover.
     """
 
-    n = len(parent1)  # Number of guests
+    offspring1, offspring2 = one_point_crossover_batch(parent1[None], parent2[None], rng)
 
-    c_point = random.randint(1, n-1)  # Random crossover point
-    
-    # Offspring representations
-    offspring1 = np.copy(parent1)
-    offspring2 = np.copy(parent2)
+    return offspring1[0], offspring2[0]
 
-    # Perform crossover at the selected point
-    offspring1[c_point:], offspring2[c_point:] = parent2[c_point:], parent1[c_point:]
+def uniform_crossover_batch(parents1: np.ndarray, parents2: np.ndarray, rng: np.random.Generator | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Perform uniform crossover on k pairs of parents at once, using a random binary mask per pair.
+
+    Parameters:
+        parents1 (np.ndarray): A (k, nr_guests) block with the first parent of each pair
+        parents2 (np.ndarray): A (k, nr_guests) block with the second parent of each pair
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Two (k, nr_guests) blocks of repaired offspring
+    """
 
-    return repair_repr(offspring1), repair_repr(offspring2)
+    # Binary masks with uniform distribution
+    mask = as_generator(rng).integers(0, 2, size=parents1.shape)
+    offspring1 = np.where(mask, parents1, parents2)
+    offspring2 = np.where(mask, parents2, parents1)
 
+    return _repair_offspring(offspring1, offspring2, parent_capacities(parents1))
 
-def uniform_crossover(parent1: np.ndarray, parent2: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+def uniform_crossover(parent1: np.ndarray, parent2: np.ndarray, rng: np.random.Generator | None = None) -> tuple[np.ndarray, np.ndarray]:
     """
     Perform uniform crossover using a random binary mask with uniform distribution.
 
     Parameters:
         parent1 (np.ndarray): The first parent representation
         parent2 (np.ndarray): The second parent representation
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
 
     Returns:
         tuple[np.ndarray, np.ndarray]: Two offspring representations after performing the crossover
     """
 
-    # Binary mask with uniform distribution
-    mask = np.random.randint(0, 2, size=len(parent1))
-    offspring1 = np.where(mask, parent1, parent2)
-    offspring2 = np.where(mask, parent2, parent1)
+    offspring1, offspring2 = uniform_crossover_batch(parent1[None], parent2[None], rng)
+
+    return offspring1[0], offspring2[0]
+
+def geometric_crossover_batch(parents1: np.ndarray, parents2: np.ndarray, alpha: float = 0.5,
+                              rng: np.random.Generator | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Perform geometric crossover on k pairs of parents at once, using a blending factor alpha.
+
+    Parameters:
+        parents1 (np.ndarray): A (k, nr_guests) block with the first parent of each pair.
+        parents2 (np.ndarray): A (k, nr_guests) block with the second parent of each pair.
+        alpha (float): Blending factor, 0 <= alpha <= 1.
+        rng (np.random.Generator | None): Not used, geometric crossover is deterministic. Accepted like in the other operators.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Two (k, nr_guests) blocks of repaired offspring.
+    """
+
+    offspring1 = np.round(alpha * parents1 + (1 - alpha) * parents2).astype(int)
+    offspring2 = np.round(alpha * parents2 + (1 - alpha) * parents1).astype(int)
 
-    return repair_repr(offspring1), repair_repr(offspring2)
+    return _repair_offspring(offspring1, offspring2, parent_capacities(parents1))
 
-def geometric_crossover(parent1: np.ndarray, parent2: np.ndarray, alpha: float = 0.5) -> tuple[np.ndarray, np.ndarray]:
+def geometric_crossover(parent1: np.ndarray, parent2: np.ndarray, alpha: float = 0.5,
+                        rng: np.random.Generator | None = None) -> tuple[np.ndarray, np.ndarray]:
     """
     Perform geometric crossover using a blending factor alpha.
 
@@ -142,36 +308,64 @@ def geometric_crossover(parent1: np.ndarray, parent2: np.ndarray, alpha: float =
         parent1 (np.ndarray): The first parent representation.
         parent2 (np.ndarray): The second parent representation.
         alpha (float): Blending factor, 0 <= alpha <= 1.
+        rng (np.random.Generator | None): Not used, geometric crossover is deterministic. Accepted like in the other operators.
 
     Returns:
         tuple[np.ndarray, np.ndarray]: Two offspring representations after performing the crossover.
     """
-    
-    offspring1 = alpha * parent1 + (1 - alpha) * parent2
-    offspring2 = alpha * parent2 + (1 - alpha) * parent1
 
-    offspring1 = repair_repr(np.round(offspring1).astype(int))
-    offspring2 = repair_repr(np.round(offspring2).astype(int))
+    offspring1, offspring2 = geometric_crossover_batch(parent1[None], parent2[None], alpha, rng)
 
-    return offspring1, offspring2
+    return offspring1[0], offspring2[0]
 
 # Not selected for grid search
-def multi_parent_crossover(parents: list[np.ndarray]) -> np.ndarray:
+def multi_parent_crossover(parents: list[np.ndarray], rng: np.random.Generator | None = None) -> np.ndarray:
     """
     Perform multi-parent crossover using 3 parents.
 
     Parameters:
         parents (list[np.ndarray]): List of 3 parent representations.
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
 
     Returns:
         np.ndarray: Repaired offspring representation after performing the crossover.
     """
 
     n = len(parents[0])
-    offspring = np.empty(n, dtype=int)
 
-    for i in range(n):
-        selected_parent = random.choice(parents)
-        offspring[i] = selected_parent[i]
+    # Each gene is taken from a randomly chosen parent
+    selected_parents = as_generator(rng).integers(0, len(parents), size=n)
+    offspring = np.asarray(parents, dtype=int)[selected_parents, np.arange(n)]
+
+    with active_profiler().phase("repair"):
+        return repair_repr(offspring, parent_capacities(np.asarray(parents[0])), out=offspring)
+
+# Batched variants of the crossover operators, taking (k, nr_guests) blocks of parents
+BATCHED_CROSSOVER = {
+    cycle_crossover: cycle_crossover_batch,
+    one_point_crossover: one_point_crossover_batch,
+    uniform_crossover: uniform_crossover_batch,
+    geometric_crossover: geometric_crossover_batch,
+}
+
+def batched_crossover(crossover_function: Callable) -> Callable | None:
+    """
+    Finds the batched variant of a crossover operator, which crosses all the pairs of parents 
+    of a generation at once. Keyword arguments bound with functools.partial (e.g. the alpha 
+    of geometric crossover) are carried over.
+
+    Parameters:
+        crossover_function (Callable): A crossover operator, possibly wrapped in functools.partial.
+
+    Returns:
+        Callable | None: A function (parents1, parents2) -> (offspring1, offspring2) over (k, nr_guests) 
+                         blocks, or None if the operator has no batched variant.
+    """
+
+    if isinstance(crossover_function, partial):
+        batched = BATCHED_CROSSOVER.get(crossover_function.func)
+        if batched is None or crossover_function.args:
+            return None
+        return partial(batched, **crossover_function.keywords)
 
-    return repair_repr(offspring)
\ No newline at end of file
+    return BATCHED_CROSSOVER.get(crossover_function)
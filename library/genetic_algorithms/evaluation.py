@@ -0,0 +1,140 @@
+# Group Members - Group P
+# Joana Esteves | 20240746 
+# Matilde Miguel | 20240549 
+# Tomás Figueiredo | 20240941 
+# Rita Serra | 20240515
+
+# General
+import numpy as np
+import os
+
+# Parallelization
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Seating arrangement problem
+from library.SA_problem.seating_arrangement import SAProblem
+
+# Fitness evaluators: callables (problem, reprs) -> fitness vector, used by Population.evaluate
+# and genetic_algorithm to score the new individuals of a generation in one call
+
+def serial_evaluator(problem: SAProblem, reprs: np.ndarray) -> np.ndarray:
+    """
+    Scores the representations one at a time.
+
+    Parameters:
+        problem (SAProblem): The problem.
+        reprs (np.ndarray): A (nr_solutions, nr_guests) array, one arrangement per row.
+
+    Returns:
+        np.ndarray: The fitness of each arrangement as floats.
+    """
+
+    return np.array([problem.fitness(repr) for repr in reprs], dtype=float)
+
+def vectorized_evaluator(problem: SAProblem, reprs: np.ndarray) -> np.ndarray:
+    """
+    Scores all the representations in a single batched call (the default).
+
+    Parameters:
+        problem (SAProblem): The problem.
+        reprs (np.ndarray): A (nr_solutions, nr_guests) array, one arrangement per row.
+
+    Returns:
+        np.ndarray: The fitness of each arrangement as floats.
+    """
+
+    return problem.batch_fitness(reprs)
+
+def _evaluate_chunk(problem: SAProblem, reprs: np.ndarray) -> np.ndarray:
+    return problem.batch_fitness(reprs)
+
+class ThreadPoolEvaluator():
+
+    # Executor of the chunks, created with max_workers workers
+    executor_class = ThreadPoolExecutor
+
+    def __init__(self, max_workers: int | None = None, min_chunk_size: int = 64):
+        """
+        Scores blocks of representations with a pool of threads, each one scoring a chunk of rows 
+        in a batched call. The batched fitness spends its time in NumPy sorts, fancy-index gathers of 
+        the same-table weights and sums over large arrays, which release the GIL, so the chunks can 
+        run in parallel. Only the Python overhead between those calls is serialized.
+
+        Use it as a context manager, or call close() when done, to stop the threads.
+
+        Parameters:
+            max_workers (int | None): Number of threads, defaults to the number of processors.
+            min_chunk_size (int): Minimum number of rows of a chunk, smaller blocks are scored in the 
+                                  calling thread. Defaults to 64.
+        """
+
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_chunk_size = min_chunk_size
+        self.executor = self.executor_class(max_workers=self.max_workers)
+
+    def chunks(self, reprs: np.ndarray) -> list[np.ndarray]:
+        # At most one chunk per worker, of at least min_chunk_size rows
+        nr_chunks = max(1, min(self.max_workers, len(reprs) // self.min_chunk_size))
+
+        return np.array_split(reprs, nr_chunks)
+
+    def __call__(self, problem: SAProblem, reprs: np.ndarray) -> np.ndarray:
+        chunks = self.chunks(reprs)
+
+        if len(chunks) == 1:
+            return problem.batch_fitness(reprs)
+
+        return np.concatenate(list(self.executor.map(_evaluate_chunk, [problem] * len(chunks), chunks)))
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ProcessPoolEvaluator(ThreadPoolEvaluator):
+
+    executor_class = ProcessPoolExecutor
+
+    def __init__(self, max_workers: int | None = None, min_chunk_size: int = 256):
+        """
+        Scores blocks of representations with a pool of worker processes, each one scoring a chunk 
+        of rows in a batched call. The problem is shared with the workers (see SAProblem.share), 
+        so only the chunks of representations and their fitness are sent between processes.
+
+        Use it as a context manager, or call close() when done, to stop the workers and delete 
+        the memory-mapped copy of the problems it shared.
+
+        Parameters:
+            max_workers (int | None): Number of worker processes, defaults to the number of processors.
+            min_chunk_size (int): Minimum number of rows of a chunk, smaller blocks are scored in the 
+                                  calling process. Defaults to 256.
+        """
+
+        super().__init__(max_workers, min_chunk_size)
+
+        # Problems shared by this evaluator, released on close
+        self.shared_problems = []
+
+    def __call__(self, problem: SAProblem, reprs: np.ndarray) -> np.ndarray:
+        chunks = self.chunks(reprs)
+
+        if len(chunks) == 1:
+            return problem.batch_fitness(reprs)
+
+        if problem._shared_path is None:
+            self.shared_problems.append(problem.share())
+
+        return np.concatenate(list(self.executor.map(_evaluate_chunk, [problem] * len(chunks), chunks)))
+
+    def close(self):
+        self.executor.shutdown()
+
+        for problem in self.shared_problems:
+            problem.release()
+
+        self.shared_problems = []
+
@@ -10,20 +10,74 @@ import numpy as np
 
 # Grid search
 from itertools import product
+from collections import Counter
 
 # Files
-import csv
 import os
 import time
 import datetime
 
+# Reproducibility
+import zlib
+
 # Parallelization
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Genetic algorithm
 from .algorithm import genetic_algorithm
 
-def single_run(run, mutation, crossover, selection, elitism, relations_mtx, pop_size, generations):
+# Results
+from .results import ResultsSink
+
+# Profiling
+from .profiling import merge_profiles
+
+# Seating arrangement problem
+from library.SA_problem.seating_arrangement import SAProblem, SASolution
+
+# Columns of each result table. The run manifest (runs) has one row per finished run
+RESULT_TABLES = {
+    "fitness_per_run": [
+        "run", "mutation", "crossover", "selection", "elitism",
+        "generation", "fitness"
+    ],
+    "avg_fitness_per_generation": [
+        "mutation", "crossover", "selection", "elitism",
+        "generation", "avg_fitness"
+    ],
+    "runs": [
+        "run", "mutation", "crossover", "selection", "elitism",
+        "sweep_seed", "spawn_key", "best_fitness", "execution_time", "best_repr", "fitness_per_gen", "stop_reason",
+        "duplicate_rate", "diversity"
+    ],
+    "profile": [
+        "mutation", "crossover", "selection", "elitism",
+        "runs", "phase", "calls", "time", "time_per_run"
+    ]
+}
+
+# Keyword arguments of genetic_algorithm accepted as termination criteria
+TERMINATION_CRITERIA = ("stagnation_window", "target_fitness", "time_budget", "max_evaluations", "min_diversity")
+
+def run_seed(sweep_seed: int, mutation_name: str, crossover_name: str, selection_name: str, elitism: int, run: int,
+             stage: int = 0) -> np.random.SeedSequence:
+    """
+    Derives the seed of one run from the seed of the whole search: a child SeedSequence, so every run 
+    gets an independent random stream. Its spawn key depends only on the names of the operators, the 
+    number of elits and the run index, so it does not change when the grid is reordered or resumed.
+    Runs continued in several stages (successive halving) get a different seed for each stage.
+
+    Returns:
+        np.random.SeedSequence: The seed of the run, reproduced from sweep_seed and its spawn_key.
+    """
+
+    comb_key = zlib.crc32(f"{mutation_name},{crossover_name},{selection_name},{elitism}".encode())
+    spawn_key = (comb_key, run) if stage == 0 else (comb_key, run, stage)
+
+    return np.random.SeedSequence(sweep_seed, spawn_key=spawn_key)
+
+def single_run(run, mutation, crossover, selection, elitism, relations_mtx, pop_size, generations, seed = None, termination = None, 
+               deduplicate = None, ga_kwargs = None, profile = False):
     """
     Executes a single run of the genetic algorithm with the given hyperparameters and returns the best solution and fitnes history.
 
@@ -33,20 +87,35 @@ def single_run(run, mutation, crossover, selection, elitism, relations_mtx, pop_
         crossover (function): The crossover function to be used in the genetic algorithm.
         selection (function): The selection function to be used in the genetic algorithm.
         elitism (int): The number of elits, if zero elitism is not applied.
-        relations_mtx (matrix): Relationship score matrix to be used by the genetic algorithm to calculate the fitness.
+        relations_mtx (SAProblem): Problem instance owning the relationship score matrix, shared with the 
+            worker processes (see SAProblem.share).
         pop_size (int): The size of the population for the genetic algorithm.
         generations (int): The number of generations to run the genetic algorithm.
+        seed (np.random.SeedSequence | int | None): Seed of the random generator of the run (see run_seed), so the run 
+            can be reproduced. Defaults to None (not seeded).
+        termination (dict | None): Termination criteria passed to genetic_algorithm (e.g. stagnation_window, 
+            target_fitness, time_budget, max_evaluations, min_diversity). Defaults to None (always run all generations).
+        deduplicate (str | None): Duplicate elimination of genetic_algorithm, "mutate", "replace" or None. Defaults to None.
+        ga_kwargs (dict | None): Other keyword arguments of genetic_algorithm (e.g. cache_size or local_search). 
+            Defaults to None.
+        profile (bool): If True, the run is profiled (see genetic_algorithm). Defaults to False.
 
     Returns:
         tuple: A tuple containing the following elements:
             - run (int): The index of the current run.
             - final_best (object): The best solution (individual) found in this run.
-            - best_fitness_per_gen (list): A list of best fitness values per generation.
+            - best_fitness_per_gen (list): A list of best fitness values per generation, shorter if the run stopped early.
+            - stop_reason (str): The criterion that ended the run.
+            - duplicate_rate (float): Average fraction of duplicates in the new populations of the run, 
+              NaN when the run does not deduplicate (see genetic_algorithm).
+            - diversity (float): Estimated pairwise diversity of the last population.
+            - profile (dict | None): Time per phase and evaluations per generation of the run, if it was profiled 
+              (see PhaseProfiler.report).
     
     """
 
     # Single run of genetic algorithm with specified hyperparameters 
-    final_best, best_fitness_per_gen = genetic_algorithm(
+    final_best, best_fitness_per_gen, info = genetic_algorithm(
         relations_mtx,
         pop_size=pop_size,
         max_gen=generations,
@@ -56,10 +125,79 @@ def single_run(run, mutation, crossover, selection, elitism, relations_mtx, pop_
         xo_prob=0.9,
         mut_prob=0.1,
         elitism=elitism, 
-        verbose=False
+        verbose=False,
+        return_info=True,
+        rng=seed,
+        deduplicate=deduplicate,
+        profile=profile,
+        **(termination or {}),
+        **(ga_kwargs or {})
     )
 
-    return run, final_best, best_fitness_per_gen
+    duplicate_rate = float(np.mean(info["duplicate_rate"])) if info["duplicate_rate"] else np.nan
+
+    return (run, final_best, best_fitness_per_gen, info["stop_reason"], duplicate_rate, 
+            info["diversity"][-1], info["profile"])
+
+def run_chunk(runs, mutation, crossover, selection, elitism, relations_mtx, pop_size, generations, seeds, termination = None, 
+              deduplicate = None, ga_kwargs = None, profile = False):
+    """
+    Executes a chunk of runs of the same combination in one task, timing each of them.
+
+    Args:
+        runs (list[int]): The indexes of the runs to execute.
+        seeds (list[np.random.SeedSequence]): The seed of each run.
+        Remaining arguments are the same as in single_run.
+
+    Returns:
+        list[tuple]: For each run, the result of single_run followed by its execution time in seconds.
+    """
+
+    results = []
+
+    for run, seed in zip(runs, seeds):
+        start_time = time.time()
+        results.append(single_run(run, mutation, crossover, selection, elitism, relations_mtx, pop_size, generations, seed, termination, 
+                                  deduplicate, ga_kwargs, profile) 
+                       + (time.time() - start_time,))
+
+    return results
+
+def continue_run(run, mutation, crossover, selection, elitism, relations_mtx, generations, seed, population = None, pop_size = 100):
+    """
+    Evolves one run of the genetic algorithm for some more generations, starting from its last population 
+    (or from a random one), and returns its new best solution, fitness history and population.
+
+    Args:
+        run (int): The index of the run.
+        population (Population | None): Last population of the run, None to start a new run.
+        pop_size (int): The size of the population when starting a new run.
+        Remaining arguments are the same as in single_run.
+
+    Returns:
+        tuple: run, final best solution, best fitness per generation of these generations, last population 
+        and execution time in seconds.
+    """
+
+    start_time = time.time()
+
+    final_best, best_fitness_per_gen, info = genetic_algorithm(
+        relations_mtx,
+        pop_size=pop_size,
+        max_gen=generations,
+        selection_algorithm=selection,
+        mutation_function=mutation,
+        crossover_function=crossover,
+        xo_prob=0.9,
+        mut_prob=0.1,
+        elitism=elitism, 
+        verbose=False,
+        initial_population=population,
+        return_info=True,
+        rng=seed
+    )
+
+    return run, final_best, best_fitness_per_gen, info["population"], time.time() - start_time
 
 def grid_search_par(relations_mtx: np.ndarray, 
              mutation_functions: list, 
@@ -70,6 +208,16 @@ def grid_search_par(relations_mtx: np.ndarray,
              generations: int = 100,
              runs: int = 30,
              verbose: bool = False,
+             max_workers: int | None = None,
+             chunksize: int = 1,
+             seed: int | None = None,
+             resume: str | None = None,
+             results_format: str = "csv",
+             buffer_size: int = 10000,
+             termination: dict | None = None,
+             deduplicate: str | None = None,
+             ga_kwargs: dict | None = None,
+             profile: bool = False,
             ) -> list[dict]:
     
     """
@@ -84,7 +232,17 @@ def grid_search_par(relations_mtx: np.ndarray,
     We assume there may be cases where more than one combination achieve the same average fitness in 
     the final generation.
 
-    The runs are parallelized for faster search.
+    The runs are parallelized for faster search. A single pool of worker processes lives for the whole 
+    search and is fed every (combination, run) task at once, so no core waits for the slowest run 
+    of a combination before the next combination starts. Results are collected as soon as they finish
+    and each combination is aggregated when its last run is done.
+
+    Results are buffered in memory and written in bulk, as csv files or as compact npz/parquet
+    columnar parts (see ResultsSink and load_results).
+
+    Every finished run is checkpointed in a run manifest (the runs table) with its seed (the seed of the 
+    search and the spawn key of the run), final best representation and fitness history. Passing the 
+    timestamp of an interrupted search as resume skips the runs already in its manifest and keeps appending to the same files.
     
     Parameters:
         relations_mtx (matrix): Relationship score matrix to be used by the genetic algorithm to calculate the fitness.
@@ -96,10 +254,29 @@ def grid_search_par(relations_mtx: np.ndarray,
         generations (int): The number of generations to run the genetic algorithm (default is 100).
         runs (int): The number of runs for each combination of parameters (default is 30).
         verbose (bool): If True, prints detailed logs for debugging. Defaults to False.
+        max_workers (int | None): Number of worker processes, defaults to the number of processors.
+        chunksize (int): Number of runs of the same combination executed by each task. Defaults to 1.
+        seed (int | None): Seed of the whole search, each run gets its own seed derived from it. 
+            Defaults to a random seed (or the seed of the resumed search).
+        resume (str | None): Timestamp of the search to resume, as found in its file names. Defaults to None.
+        results_format (str): Format of the result tables, one of "csv", "npz" or "parquet". Defaults to "csv".
+        buffer_size (int): Number of rows of a result table buffered before writing them. Defaults to 10000.
+        termination (dict | None): Early termination criteria of every run, passed to genetic_algorithm 
+            (stagnation_window, target_fitness, time_budget, max_evaluations, min_diversity). The criterion 
+            that ended each run is recorded in the run manifest, with its average duplicate rate and final 
+            diversity. Defaults to None (all runs last all generations).
+        deduplicate (str | None): Duplicate elimination of every run, "mutate" or "replace" (see genetic_algorithm). 
+            Defaults to None.
+        ga_kwargs (dict | None): Other keyword arguments of genetic_algorithm given to every run, e.g. cache_size 
+            or local_search. Defaults to None.
+        profile (bool): If True, every run is profiled (see genetic_algorithm) and the time and calls of each 
+            phase, added up over the runs of each combination, are logged in the profile table. Runs restored 
+            from the run manifest of a resumed search are not profiled. Defaults to False.
     
     Returns:
         list[dict]: A list with one dictionary containing the best-performing combination(s), corresponding average 
-        fitness in the final generation and solution with the highest fitness.
+        fitness in the final generation and solution with the highest fitness. With profile, it also has 
+        the merged profile of the runs of the combination (see merge_profiles).
     """
     
     # Fixed hyperparameters:
@@ -113,132 +290,447 @@ def grid_search_par(relations_mtx: np.ndarray,
     if elitism is None:
         elitism = [1] 
 
-    # Timestamp to differentiate files
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    # Timestamp to differentiate files, a resumed search keeps its files
+    timestamp = resume if resume is not None else datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
-    # Create files to save results
-    fitness_per_run_log = f"fitness_per_run_{timestamp}.csv"
-    avg_fitness_per_gen_log = f"avg_fitness_per_generation_{timestamp}.csv"
+    # Buffered sink for the results, creates the files if they do not exist yet
+    if resume is not None and not os.path.exists(ResultsSink(timestamp, {}, results_format).path("runs")):
+        raise FileNotFoundError(f"No run manifest of the search {resume} to resume from.")
 
-    if not os.path.exists(fitness_per_run_log):
-        with open(fitness_per_run_log, mode='w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "run", "mutation", "crossover", "selection", "elitism",
-                "generation", "fitness"
-            ])
+    if termination is not None and not set(termination) <= set(TERMINATION_CRITERIA):
+        raise ValueError(f"Termination criteria must be among {TERMINATION_CRITERIA}, "
+                         "other arguments of genetic_algorithm go in ga_kwargs.")
 
-    if not os.path.exists(avg_fitness_per_gen_log):
-        with open(avg_fitness_per_gen_log, mode='w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "mutation", "crossover", "selection", "elitism",
-                "generation", "avg_fitness"
-            ])
+    sink = ResultsSink(timestamp, RESULT_TABLES, results_format, buffer_size)
     
     # Define hyperparameter grid
-    param_grid = product(   
+    param_grid = list(product(   
         mutation_functions,
         crossover_functions,
         selection_functions,
         elitism
-        )
+        ))
 
-    best_combinations_info = []
-    best_avg_fitness = 0
+    # Runs already checkpointed by a previous call
+    finished_runs = load_run_manifest(sink)
 
-    # Iterate trough each combination of hyperparameters
-    for mutation, crossover, selection, elitism in param_grid:
-       
-        if verbose: 
-            print(f"_________________________________________________________________________________________________________________")
-            print(f"Mutation: {mutation.__name__}, Crossover: {crossover.__name__}, Selection: {selection.__name__}, Elits: {elitism}")
+    # Reuse the seed of the resumed search so the remaining runs get the same seeds
+    if seed is None:
+        seed = next(iter(finished_runs.values()))["sweep_seed"] if finished_runs else int(np.random.SeedSequence().entropy % 2**63)
 
-        start_time = time.time()
-        
-        runs_fitness_per_gen = []
-        best_solutions = []
-
-         # Parallelize the 30 runs for current combination
-        with ProcessPoolExecutor() as executor:
-            futures = [
-                executor.submit(single_run, run, mutation, crossover, selection, elitism, relations_mtx, pop_size, generations)
-                for run in range(1, runs + 1)
-            ]
-
-            for future in futures:
-                run_idx, final_best, best_fitness_per_gen = future.result()
-                runs_fitness_per_gen.append(best_fitness_per_gen)
-                best_solutions.append(final_best)
-
-                # Log fitness per generation for current run
-                with open(fitness_per_run_log, mode='a', newline='') as f:
-                    writer = csv.writer(f)
+    if resume is not None:
+        clean_resumed_logs(finished_runs, runs, sink)
+
+    logged_combinations = set(
+        tuple(row) for row in sink.load("avg_fitness_per_generation")[["mutation", "crossover", "selection", "elitism"]]
+        .drop_duplicates().itertuples(index=False)
+    )
+
+    # Shared with the worker processes, see SAProblem.share
+    problem = SAProblem.of(relations_mtx).share()
+
+    # Results of each combination, filled as runs finish
+    runs_results = {comb_idx: [] for comb_idx in range(len(param_grid))}
+    runs_profiles = {comb_idx: [] for comb_idx in range(len(param_grid))}
+    combinations_summary = {}
+
+    try:
+        # Restore the checkpointed runs
+        pending_runs = {}
+        for comb_idx, (mutation, crossover, selection, comb_elitism) in enumerate(param_grid):
+            comb_key = (mutation.__name__, crossover.__name__, selection.__name__, comb_elitism)
+            pending_runs[comb_idx] = []
+
+            for run in range(1, runs + 1):
+                row = finished_runs.get(comb_key + (run,))
+                if row is None:
+                    pending_runs[comb_idx].append(run)
+                else:
+                    final_best = SASolution(problem, row["best_repr"])
+                    runs_results[comb_idx].append((run, final_best, row["fitness_per_gen"], row["execution_time"]))
+
+            if not pending_runs[comb_idx]:
+                combinations_summary[comb_idx] = summarize_combination(
+                    runs_results.pop(comb_idx), mutation, crossover, selection, comb_elitism, 
+                    sink, verbose, log=comb_key not in logged_combinations
+                )
+
+        # One long-lived pool for the whole search
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+
+            # Submit the full cross product of combinations and (chunks of) pending runs
+            futures = {}
+            for comb_idx, (mutation, crossover, selection, comb_elitism) in enumerate(param_grid):
+                for chunk_start in range(0, len(pending_runs[comb_idx]), chunksize):
+                    chunk = pending_runs[comb_idx][chunk_start:chunk_start + chunksize]
+                    seeds = [run_seed(seed, mutation.__name__, crossover.__name__, selection.__name__, comb_elitism, run) 
+                             for run in chunk]
+                    future = executor.submit(run_chunk, chunk, mutation, crossover, selection, comb_elitism, 
+                                             problem, pop_size, generations, seeds, termination, deduplicate, ga_kwargs, profile)
+                    futures[future] = (comb_idx, seeds)
+
+            for future in as_completed(futures):
+                comb_idx, seeds = futures[future]
+                mutation, crossover, selection, comb_elitism = param_grid[comb_idx]
+
+                for (run_idx, final_best, best_fitness_per_gen, stop_reason, duplicate_rate, diversity, run_profile, run_time), \
+                        seed_of_run in zip(future.result(), seeds):
+                    runs_results[comb_idx].append((run_idx, final_best, best_fitness_per_gen, run_time))
+                    runs_profiles[comb_idx].append(run_profile)
+
+                    # Log fitness per generation for current run
                     for generation, fitness in enumerate(best_fitness_per_gen, 1):
-                        writer.writerow([
+                        sink.append("fitness_per_run", [
                             run_idx,
                             mutation.__name__,
                             crossover.__name__,
                             selection.__name__,
-                            elitism,
+                            comb_elitism,
                             generation,
                             fitness
                         ])
 
-                if verbose:
-                    print(f"Run {run_idx}: Best fitness = {final_best.fitness()}")
+                    # Checkpoint the run, the sink writes it after its fitness history
+                    sink.append("runs", [
+                        run_idx,
+                        mutation.__name__,
+                        crossover.__name__,
+                        selection.__name__,
+                        comb_elitism,
+                        seed,
+                        " ".join(str(key) for key in seed_of_run.spawn_key),
+                        final_best.fitness(),
+                        run_time,
+                        " ".join(str(table) for table in final_best.repr),
+                        " ".join(str(fitness) for fitness in best_fitness_per_gen),
+                        stop_reason,
+                        duplicate_rate,
+                        diversity
+                    ])
 
-        # Compute average fitness per generation across all runs
-        fitness_df = pd.DataFrame(runs_fitness_per_gen).T
-        avg_fitness_per_gen = fitness_df.mean(axis=1)
+                    if verbose:
+                        print(f"Mutation: {mutation.__name__}, Crossover: {crossover.__name__}, Selection: {selection.__name__}, "
+                              f"Elits: {comb_elitism}, Run {run_idx}: Best fitness = {final_best.fitness()}, "
+                              f"Generations = {len(best_fitness_per_gen)} ({stop_reason}), "
+                              f"Duplicate rate = {duplicate_rate:.3f}, Diversity = {diversity:.3f}")
+
+                # Aggregate the combination once all its runs are done
+                if len(runs_results[comb_idx]) == runs:
+                    combinations_summary[comb_idx] = summarize_combination(
+                        runs_results.pop(comb_idx), mutation, crossover, selection, comb_elitism, 
+                        sink, verbose
+                    )
+
+                    # Aggregate the profiles of its runs
+                    comb_profile = merge_profiles(runs_profiles.pop(comb_idx))
+                    if comb_profile is not None:
+                        log_profile(comb_profile, mutation, crossover, selection, comb_elitism, sink)
+                        combinations_summary[comb_idx]["profile"] = comb_profile
+    finally:
+        # Write the buffered results and delete the memory-mapped copy of the matrix
+        sink.close()
+        problem.release()
+
+    best_combinations_info = []
+    best_avg_fitness = 0
+
+    # Iterate trough each combination of hyperparameters, in grid order
+    for comb_idx in range(len(param_grid)):
+        summary = combinations_summary[comb_idx]
+        last_gen_avg_fitness = summary["last_gen_avg_fitness"]
 
-        # Log average fitness per generation fot current combination
-        for generation, avg_fitness in enumerate(avg_fitness_per_gen, 1):
-            with open(avg_fitness_per_gen_log, mode='a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    mutation.__name__,
-                    crossover.__name__,
-                    selection.__name__,
-                    elitism,
-                    generation,
-                    avg_fitness
-                ])
-
-        # Get average fitness of last generation for current combination
-        last_gen_avg_fitness = avg_fitness_per_gen.iloc[-1]
-        execution_time = time.time() - start_time
-
-        if verbose:
-            print(f"Last generation average fitness = {last_gen_avg_fitness}")
-
-        # Find final solution with highest fitness across all runs
-        solution_highest_fitness = max(best_solutions, key=lambda s: s.fitness())
-        
         # If current combination has better avg fitness at last gen replace best combination info
         if last_gen_avg_fitness > best_avg_fitness:
             best_avg_fitness = last_gen_avg_fitness
-            best_combinations_info = [{ 
-                "mutation": mutation.__name__,
-                "crossover": crossover.__name__,
-                "selection": selection.__name__,
-                "elitism": elitism,
-                "last_gen_avg_fitness": last_gen_avg_fitness,
-                "solution_highest_fitness": solution_highest_fitness,
-                "execution_time": execution_time
-            }]
+            best_combinations_info = [summary]
         # If current combination has equal avg fitness at last gen add best combination info
         # to list of best combinations
         elif last_gen_avg_fitness == best_avg_fitness:
-            best_combinations_info.append({  
-                "mutation": mutation.__name__,
-                "crossover": crossover.__name__,
-                "selection": selection.__name__,
-                "elitism": elitism,
-                "last_gen_avg_fitness": last_gen_avg_fitness,
-                "solution_highest_fitness": solution_highest_fitness,
-                "execution_time": execution_time
-            })
+            best_combinations_info.append(summary)
  
     return best_combinations_info
 
+def summarize_combination(runs_results, mutation, crossover, selection, elitism, sink, verbose = False, log = True):
+    """
+    Aggregates all runs of one combination: logs the average fitness per generation across runs 
+    and finds the final solution with the highest fitness.
+
+    Args:
+        runs_results (list[tuple]): (run, final_best, best_fitness_per_gen, run_time) for every run of the combination.
+        mutation (function): The mutation function of the combination.
+        crossover (function): The crossover function of the combination.
+        selection (function): The selection function of the combination.
+        elitism (int): The number of elits of the combination.
+        sink (ResultsSink | None): Sink of the result tables, None when nothing is logged.
+        verbose (bool): If True, prints detailed logs for debugging. Defaults to False.
+        log (bool): If False, the average fitness per generation is not logged (e.g. it already was before resuming).
+
+    Returns:
+        dict: Summary of the combination, in the format of best_combinations_info. 
+        The execution time is the total time spent running the combination's runs.
+    """
+
+    # Runs finish in any order, average them in run order
+    runs_results = sorted(runs_results, key=lambda result: result[0])
+    runs_fitness_per_gen = [best_fitness_per_gen for _, _, best_fitness_per_gen, _ in runs_results]
+    best_solutions = [final_best for _, final_best, _, _ in runs_results]
+    execution_time = sum(run_time for _, _, _, run_time in runs_results)
+
+    # Compute average fitness per generation across all runs, runs that stopped early 
+    # keep their last best fitness for the remaining generations
+    fitness_df = pd.DataFrame(runs_fitness_per_gen).T.ffill()
+    avg_fitness_per_gen = fitness_df.mean(axis=1)
+
+    # Log average fitness per generation fot current combination
+    if log:
+        for generation, avg_fitness in enumerate(avg_fitness_per_gen, 1):
+            sink.append("avg_fitness_per_generation", [
+                mutation.__name__,
+                crossover.__name__,
+                selection.__name__,
+                elitism,
+                generation,
+                avg_fitness
+            ])
+
+    # Get average fitness of last generation for current combination
+    last_gen_avg_fitness = avg_fitness_per_gen.iloc[-1]
+
+    if verbose:
+        print(f"Mutation: {mutation.__name__}, Crossover: {crossover.__name__}, Selection: {selection.__name__}, "
+              f"Elits: {elitism}, Last generation average fitness = {last_gen_avg_fitness}")
+
+    # Find final solution with highest fitness across all runs
+    solution_highest_fitness = max(best_solutions, key=lambda s: s.fitness())
+
+    return {
+        "mutation": mutation.__name__,
+        "crossover": crossover.__name__,
+        "selection": selection.__name__,
+        "elitism": elitism,
+        "last_gen_avg_fitness": last_gen_avg_fitness,
+        "solution_highest_fitness": solution_highest_fitness,
+        "execution_time": execution_time
+    }
+
+def log_profile(profile, mutation, crossover, selection, elitism, sink):
+    """
+    Logs the merged profile of the runs of one combination, one row per phase.
+
+    Args:
+        profile (dict): Merged profile of the runs, as returned by merge_profiles.
+        mutation (function): The mutation function of the combination.
+        crossover (function): The crossover function of the combination.
+        selection (function): The selection function of the combination.
+        elitism (int): The number of elits of the combination.
+        sink (ResultsSink): Sink of the result tables.
+    """
+
+    for phase, totals in profile["phases"].items():
+        sink.append("profile", [
+            mutation.__name__,
+            crossover.__name__,
+            selection.__name__,
+            elitism,
+            profile["runs"],
+            phase,
+            totals["calls"],
+            totals["time"],
+            totals["time"] / profile["runs"]
+        ])
+
+def load_run_manifest(sink: ResultsSink) -> dict:
+    """
+    Reads the runs checkpointed in the run manifest.
+
+    Args:
+        sink (ResultsSink): Sink of the result tables.
+
+    Returns:
+        dict: For each (mutation, crossover, selection, elitism, run), its seeds, best fitness, execution time,
+        best representation and fitness history.
+    """
+
+    finished_runs = {}
+
+    for row in sink.load("runs").to_dict("records"):
+        key = (row["mutation"], row["crossover"], row["selection"], int(row["elitism"]), int(row["run"]))
+        finished_runs[key] = {
+            "sweep_seed": int(row["sweep_seed"]),
+            "spawn_key": tuple(int(key) for key in str(row["spawn_key"]).split()),
+            "best_fitness": float(row["best_fitness"]),
+            "execution_time": float(row["execution_time"]),
+            "best_repr": np.array(str(row["best_repr"]).split(), dtype=int),
+            "fitness_per_gen": [float(fitness) for fitness in str(row["fitness_per_gen"]).split()],
+            "stop_reason": row.get("stop_reason", "max_gen")
+        }
+
+    return finished_runs
+
+def clean_resumed_logs(finished_runs: dict, runs: int, sink: ResultsSink):
+    """
+    Removes from the logs of an interrupted search the rows written by runs that were not checkpointed
+    and the averages of combinations with unfinished runs, so resuming does not duplicate them.
+
+    Args:
+        finished_runs (dict): The runs in the run manifest, as returned by load_run_manifest.
+        runs (int): The number of runs for each combination.
+        sink (ResultsSink): Sink of the result tables.
+    """
+
+    comb_columns = ["mutation", "crossover", "selection", "elitism"]
+
+    fitness_per_run = sink.load("fitness_per_run")
+    finished = [tuple(row) in finished_runs for row in fitness_per_run[comb_columns + ["run"]].itertuples(index=False)]
+    if not all(finished):
+        sink.rewrite("fitness_per_run", fitness_per_run[finished])
+
+    finished_per_comb = Counter(key[:4] for key in finished_runs)
+    avg_fitness_per_gen = sink.load("avg_fitness_per_generation")
+    complete = [finished_per_comb.get(tuple(row), 0) >= runs for row in avg_fitness_per_gen[comb_columns].itertuples(index=False)]
+    if not all(complete):
+        sink.rewrite("avg_fitness_per_generation", avg_fitness_per_gen[complete])
+
+def successive_halving_search(relations_mtx: np.ndarray, 
+             mutation_functions: list, 
+             crossover_functions: list, 
+             selection_functions: list, 
+             elitism: list | None = None, 
+             pop_size: int = 100, 
+             generations: int = 100,
+             runs: int = 30,
+             min_generations: int = 10,
+             eta: int = 3,
+             verbose: bool = False,
+             max_workers: int | None = None,
+             seed: int | None = None,
+            ) -> list[dict]:
+    """
+    Adaptive alternative to grid_search_par over the same grid of mutation, crossover, selection functions 
+    and elitism, using successive halving.
+
+    All combinations start with a small budget of min_generations generations per run. After each stage 
+    only the best 1/eta of the combinations (by average fitness of the runs in their last generation) 
+    survive, and their runs continue from their last population for eta times more generations, 
+    until they reach the full number of generations. The compute of the dropped combinations is 
+    therefore given to the survivors, and the final decision is taken between full-length runs 
+    exactly as in grid_search_par.
+
+    Parameters:
+        Same as grid_search_par, plus:
+        min_generations (int): Generations of every run in the first stage, at least 1. Defaults to 10.
+        eta (int): Reduction factor, at least 2: 1/eta of the combinations survive each stage. Defaults to 3.
+        seed (int | None): Seed of the search, each run and stage gets its own seed derived from it.
+
+    Returns:
+        list[dict]: Same structure as the best_combinations_info returned by grid_search_par.
+    """
+
+    if eta < 2:
+        raise ValueError("The reduction factor eta must be at least 2.")
+
+    if min_generations < 1:
+        raise ValueError("The number of generations of the first stage must be at least 1.")
+
+    # If no elit nr is specific, fix to 1
+    if elitism is None:
+        elitism = [1] 
+
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2**63)
+
+    # Define hyperparameter grid
+    param_grid = list(product(   
+        mutation_functions,
+        crossover_functions,
+        selection_functions,
+        elitism
+        ))
+
+    # State of every run of each surviving combination: run -> (final_best, fitness history, population, time)
+    runs_state = {comb_idx: {run: (None, [], None, 0.0) for run in range(1, runs + 1)} for comb_idx in range(len(param_grid))}
+
+    # Generations reached at the end of each stage
+    stage_generations = []
+    stage_budget = min_generations
+    while stage_budget < generations:
+        stage_generations.append(stage_budget)
+        stage_budget *= eta
+    stage_generations.append(generations)
+
+    # Shared with the worker processes, see SAProblem.share
+    problem = SAProblem.of(relations_mtx).share()
+
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            done_generations = 0
+
+            for stage, stage_budget in enumerate(stage_generations):
+
+                # Continue every run of the surviving combinations up to the stage budget
+                futures = {}
+                for comb_idx, comb_runs in runs_state.items():
+                    mutation, crossover, selection, comb_elitism = param_grid[comb_idx]
+
+                    for run, (_, _, population, _) in comb_runs.items():
+                        stage_seed = run_seed(seed, mutation.__name__, crossover.__name__, selection.__name__, comb_elitism, run, stage)
+                        future = executor.submit(continue_run, run, mutation, crossover, selection, comb_elitism, problem, 
+                                                 stage_budget - done_generations, stage_seed, population, pop_size)
+                        futures[future] = comb_idx
+
+                for future in as_completed(futures):
+                    comb_idx = futures[future]
+                    run, final_best, best_fitness_per_gen, population, run_time = future.result()
+                    _, history, _, total_time = runs_state[comb_idx][run]
+                    runs_state[comb_idx][run] = (final_best, history + best_fitness_per_gen, population, total_time + run_time)
+
+                done_generations = stage_budget
+
+                # Average fitness of the runs in the last generation
+                avg_fitness = {
+                    comb_idx: np.mean([history[-1] for _, history, _, _ in comb_runs.values()]) 
+                    for comb_idx, comb_runs in runs_state.items()
+                }
+
+                if verbose:
+                    print(f"Stage {stage + 1}: {len(runs_state)} combinations evolved up to generation {stage_budget}")
+
+                # Keep the best 1/eta combinations for the next stage
+                if stage < len(stage_generations) - 1:
+                    nr_survivors = max(1, int(np.ceil(len(runs_state) / eta)))
+                    ranked = sorted(runs_state, key=lambda comb_idx: avg_fitness[comb_idx], reverse=True)
+
+                    for comb_idx in ranked[nr_survivors:]:
+                        if verbose:
+                            mutation, crossover, selection, comb_elitism = param_grid[comb_idx]
+                            print(f"Dropped Mutation: {mutation.__name__}, Crossover: {crossover.__name__}, "
+                                  f"Selection: {selection.__name__}, Elits: {comb_elitism}, "
+                                  f"Average fitness = {avg_fitness[comb_idx]}")
+                        del runs_state[comb_idx]
+    finally:
+        # Delete the memory-mapped copy of the matrix
+        problem.release()
+
+    best_combinations_info = []
+    best_avg_fitness = 0
+
+    # Compare the surviving combinations after the full number of generations, in grid order
+    for comb_idx in sorted(runs_state):
+        mutation, crossover, selection, comb_elitism = param_grid[comb_idx]
+        runs_results = [
+            (run, final_best, history, total_time) 
+            for run, (final_best, history, _, total_time) in runs_state[comb_idx].items()
+        ]
+        summary = summarize_combination(runs_results, mutation, crossover, selection, comb_elitism, None, verbose, log=False)
+        last_gen_avg_fitness = summary["last_gen_avg_fitness"]
+
+        # If current combination has better avg fitness at last gen replace best combination info
+        if last_gen_avg_fitness > best_avg_fitness:
+            best_avg_fitness = last_gen_avg_fitness
+            best_combinations_info = [summary]
+        # If current combination has equal avg fitness at last gen add best combination info
+        # to list of best combinations
+        elif last_gen_avg_fitness == best_avg_fitness:
+            best_combinations_info.append(summary)
+
+    return best_combinations_info
@@ -0,0 +1,242 @@
+# Group Members - Group P
+# Joana Esteves | 20240746 
+# Matilde Miguel | 20240549 
+# Tomás Figueiredo | 20240941 
+# Rita Serra | 20240515
+
+# General
+import numpy as np
+from typing import Callable
+
+# Parallelization
+from concurrent.futures import ProcessPoolExecutor
+
+# Genetic algorithm
+from .algorithm import genetic_algorithm
+from .population import Population
+
+# Seating arrangement problem
+from library.SA_problem.seating_arrangement import SAProblem
+
+# Supported migration topologies
+TOPOLOGIES = ("ring", "fully_connected")
+
+def migration_targets(island: int, nr_islands: int, topology: str = "ring") -> list[int]:
+    """
+    Islands that receive the emigrants of an island.
+
+    Parameters:
+        island (int): Index of the sending island.
+        nr_islands (int): Number of islands.
+        topology (str): "ring" (each island sends to the next one) or "fully_connected" (to all the others).
+
+    Returns:
+        list[int]: Indexes of the receiving islands.
+    """
+
+    if topology == "ring":
+        return [(island + 1) % nr_islands] if nr_islands > 1 else []
+
+    return [other for other in range(nr_islands) if other != island]
+
+def evolve_island(island, relations_mtx, reprs, fitness, pop_size, generations, selection, mutation, crossover,
+                  xo_prob, mut_prob, elitism, seed):
+    """
+    Evolves one island for one epoch in a worker process, starting from its last population
+    (or from a random one).
+
+    Args:
+        island (int): The index of the island.
+        relations_mtx (SAProblem): Problem instance owning the relationship score matrix, shared with the workers.
+        reprs (np.ndarray | None): (pop_size, nr_guests) representations of the island, None to start from a random population.
+        fitness (np.ndarray | None): Known fitness of each representation.
+        seed (np.random.SeedSequence): Seed of the random generator of this island and epoch.
+        Remaining arguments are the same as in genetic_algorithm.
+
+    Returns:
+        tuple: island, representations and fitness of its last population and best fitness per generation.
+    """
+
+    population = None if reprs is None else Population(relations_mtx, reprs, fitness, validate=False)
+
+    _, best_fitness_per_gen, info = genetic_algorithm(
+        relations_mtx,
+        pop_size=pop_size,
+        max_gen=generations,
+        selection_algorithm=selection,
+        mutation_function=mutation,
+        crossover_function=crossover,
+        xo_prob=xo_prob,
+        mut_prob=mut_prob,
+        elitism=elitism,
+        verbose=False,
+        initial_population=population,
+        return_info=True,
+        rng=seed
+    )
+
+    return island, info["population"].reprs, info["population"].fitness, best_fitness_per_gen
+
+def migrate(reprs: list[np.ndarray], fitness: list[np.ndarray], migration_size: int, topology: str = "ring"):
+    """
+    Sends copies of the best individuals of every island to its target islands, where they replace
+    the worst individuals. Emigrants are picked from all islands before any of them is replaced.
+
+    Parameters:
+        reprs (list[np.ndarray]): Representations of each island, updated in place.
+        fitness (list[np.ndarray]): Fitness of each island, updated in place.
+        migration_size (int): Number of individuals sent by each island to each target.
+        topology (str): Migration topology, "ring" or "fully_connected".
+    """
+
+    nr_islands = len(reprs)
+
+    # The payload of each island: the representations and fitness of its best individuals
+    emigrants = []
+
+    for island in range(nr_islands):
+        best = np.argsort(-fitness[island], kind="stable")[:migration_size]
+        emigrants.append((reprs[island][best].copy(), fitness[island][best].copy()))
+
+    # Immigrants of each island, by receiving island
+    immigrants = {island: [] for island in range(nr_islands)}
+
+    for island in range(nr_islands):
+        for target in migration_targets(island, nr_islands, topology):
+            immigrants[target].append(emigrants[island])
+
+    for island, payloads in immigrants.items():
+        if not payloads:
+            continue
+
+        new_reprs = np.concatenate([payload[0] for payload in payloads])
+        new_fitness = np.concatenate([payload[1] for payload in payloads])
+
+        # At most pop_size - 1 immigrants, so the island keeps its own best individual
+        nr_immigrants = min(len(new_fitness), len(fitness[island]) - 1)
+        best_immigrants = np.argsort(-new_fitness, kind="stable")[:nr_immigrants]
+        worst = np.argsort(fitness[island], kind="stable")[:nr_immigrants]
+
+        reprs[island][worst] = new_reprs[best_immigrants]
+        fitness[island][worst] = new_fitness[best_immigrants]
+
+def island_genetic_algorithm(
+    relations_mtx: np.ndarray | SAProblem,
+    pop_size: int,
+    max_gen: int,
+    selection_algorithm: Callable,
+    mutation_function: Callable,
+    crossover_function: Callable,
+    xo_prob: float = 0.9,
+    mut_prob: float = 0.2,
+    elitism: int = 1,
+    nr_islands: int = 4,
+    migration_interval: int = 10,
+    migration_size: int = 2,
+    topology: str = "ring",
+    max_workers: int | None = None,
+    seed: int | None = None,
+    verbose: bool = False,
+    return_info: bool = False
+):
+    """
+    Executes an island model genetic algorithm: several sub-populations (islands) evolve in
+    separate worker processes and exchange their best individuals every migration_interval generations.
+
+    Between migrations each island runs genetic_algorithm, continued from its last population.
+    Only compact arrays of representations and fitness values travel between the processes,
+    the problem itself is shared with the workers (see SAProblem.share).
+
+    Parameters:
+        relations_mtx (np.ndarray | SAProblem): Relationship score matrix used to calculate the fitness.
+        pop_size (int): Number of individuals in each island.
+        max_gen (int): The maximum number of generations to evolve.
+        selection_algorithm (Callable): Function used for selecting individuals.
+        mutation_function (Callable): Function used to apply mutation.
+        crossover_function (Callable): Function used to apply crossover.
+        xo_prob (float): Probability of applying crossover. Defaults to 0.9.
+        mut_prob (float): Probability of applying mutation. Defaults to 0.2.
+        elitism (int): Carries nr of elits in each island, if 0 no elitism is applied. Defaults to 1.
+        nr_islands (int): Number of islands. Defaults to 4.
+        migration_interval (int): Number of generations between migrations. Defaults to 10.
+        migration_size (int): Number of best individuals each island sends to each of its targets. Defaults to 2.
+        topology (str): Migration topology, "ring" or "fully_connected". Defaults to "ring".
+        max_workers (int | None): Number of worker processes, defaults to the number of processors.
+        seed (int | None): Seed of the run, each island and epoch gets its own random stream spawned from it. 
+            Defaults to None (fresh entropy, reported in the info).
+        verbose (bool): If True, prints the best fitness after each epoch. Defaults to False.
+        return_info (bool): If True, also returns a dictionary with information about the run. Defaults to False.
+
+    Returns:
+        Solution: The best solution found on the last populations of all islands.
+        List: List of fitness values from the best individual across islands in each generation.
+        dict (only if return_info): Information about the run:
+            - populations (list[Population]): The last population of each island.
+            - seed (int): Seed of the run, to reproduce it.
+    """
+
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Topology must be one of {TOPOLOGIES}.")
+
+    # Shared with the worker processes, see SAProblem.share
+    problem = SAProblem.of(relations_mtx).share()
+
+    # Root of the random streams of the islands, from fresh entropy if no seed is given
+    root_seed = np.random.SeedSequence(seed)
+
+    # Representations and fitness of each island, None until its first epoch
+    reprs = [None] * nr_islands
+    fitness = [None] * nr_islands
+    best_fitness_per_gen = []
+
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            done_generations = 0
+            epoch = 0
+
+            while done_generations < max_gen:
+                generations = min(migration_interval, max_gen - done_generations)
+
+                # Each island and epoch gets its own independent random stream
+                seeds = [np.random.SeedSequence(root_seed.entropy, spawn_key=(island, epoch)) for island in range(nr_islands)]
+
+                futures = [
+                    executor.submit(
+                        evolve_island, island, problem, reprs[island], fitness[island], pop_size, generations,
+                        selection_algorithm, mutation_function, crossover_function, xo_prob, mut_prob, elitism,
+                        seeds[island]
+                    )
+                    for island in range(nr_islands)
+                ]
+
+                # Best fitness across islands in each generation of the epoch
+                histories = []
+
+                for future in futures:
+                    island, reprs[island], fitness[island], history = future.result()
+                    histories.append(history)
+
+                best_fitness_per_gen.extend(np.max(histories, axis=0).tolist())
+                done_generations += generations
+                epoch += 1
+
+                if verbose:
+                    print(f'Epoch {epoch}, generation {done_generations}: best fitness {best_fitness_per_gen[-1]}')
+
+                # Exchange the best individuals, except after the last epoch
+                if done_generations < max_gen:
+                    migrate(reprs, fitness, migration_size, topology)
+    finally:
+        # Delete the memory-mapped copy of the matrix
+        problem.release()
+
+    populations = [Population(problem, reprs[island], fitness[island], validate=False) for island in range(nr_islands)]
+
+    # Best individual across all islands
+    best_island = int(np.argmax([population.fitness.max() for population in populations]))
+    final_best = populations[best_island][int(populations[best_island].best(1)[0])]
+
+    if return_info:
+        return final_best, best_fitness_per_gen, {"populations": populations, "seed": root_seed.entropy}
+
+    return final_best, best_fitness_per_gen
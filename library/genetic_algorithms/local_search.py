@@ -0,0 +1,109 @@
+# Group Members - Group P
+# Joana Esteves | 20240746 
+# Matilde Miguel | 20240549 
+# Tomás Figueiredo | 20240941 
+# Rita Serra | 20240515
+
+# General
+import numpy as np
+
+# Seating arrangement problem
+from library.SA_problem.seating_arrangement import SASolution, as_generator
+
+def first_improvement_local_search(solution: SASolution, max_evaluations: int = 1000,
+                                   rng: np.random.Generator | None = None) -> int:
+    """
+    2-swap hill climbing that applies the first improving swap found.
+
+    Guests are visited in random order, and the swaps of a guest with every guest at another 
+    table are scored at once with incremental swap deltas. The best of them is applied if it 
+    improves the fitness. The search stops when a full pass over the guests finds no 
+    improvement (a local optimum) or the evaluation budget is used.
+
+    The solution is improved in place, its fitness and affinity are kept up to date by swap().
+
+    Parameters:
+        solution (SASolution): The solution to improve.
+        max_evaluations (int): Maximum number of swaps scored. Defaults to 1000.
+        rng (np.random.Generator | None): Random generator of the order of the guests. Defaults to a new unseeded generator.
+
+    Returns:
+        int: Number of swaps scored.
+    """
+
+    rng = as_generator(rng)
+    evaluations = 0
+    improved = True
+
+    while improved:
+        improved = False
+
+        for guest1 in rng.permutation(solution.nr_guests):
+            # Every guest at another table is a candidate
+            nr_candidates = np.count_nonzero(solution.repr != solution.repr[guest1])
+
+            if evaluations + nr_candidates > max_evaluations:
+                return evaluations
+
+            deltas = solution.swap_deltas(guest1)
+            evaluations += nr_candidates
+
+            guest2 = np.argmax(deltas)
+
+            if deltas[guest2] > 0:
+                solution.swap(guest1, guest2)
+                improved = True
+
+    return evaluations
+
+def steepest_local_search(solution: SASolution, max_evaluations: int = 1000,
+                          rng: np.random.Generator | None = None) -> int:
+    """
+    2-swap hill climbing that applies the best swap out of all pairs of guests at each step.
+
+    All swaps are scored at once from the affinity matrix of the solution. The search stops 
+    when no swap improves the fitness (a local optimum) or the evaluation budget is used. 
+    The first step is always taken, even when scoring all the swaps exceeds the budget 
+    (e.g. 1792 swaps for the 64 guests of the wedding), so a small budget still improves the solution.
+
+    The solution is improved in place, its fitness and affinity are kept up to date by swap().
+
+    Parameters:
+        solution (SASolution): The solution to improve.
+        max_evaluations (int): Maximum number of swaps scored, apart from the first step. Defaults to 1000.
+        rng (np.random.Generator | None): Not used, the search is deterministic. Accepted like in first_improvement_local_search.
+
+    Returns:
+        int: Number of swaps scored.
+    """
+
+    weights = solution.problem.weights
+    guests = np.arange(solution.nr_guests)
+
+    # Every pair of guests is scored, so sparse weights are expanded to the full matrix
+    if solution.problem.sparse:
+        weights = weights.toarray()
+    evaluations = 0
+
+    # Number of swaps between guests at different tables, scored at every step
+    different_tables = solution.repr[:, None] != solution.repr[None, :]
+    nr_swaps = np.count_nonzero(different_tables) // 2
+
+    while evaluations == 0 or evaluations + nr_swaps <= max_evaluations:
+        affinity = solution.affinity
+        current = affinity[guests, solution.repr]
+
+        # deltas[g1][g2]: gain of g1 moving to the table of g2 plus the gain of g2 moving to the table of g1
+        to_other_table = affinity[:, solution.repr] - current[:, None]
+        deltas = to_other_table + to_other_table.T - 2 * weights
+        deltas = np.where(solution.repr[:, None] != solution.repr[None, :], deltas, 0)
+        evaluations += nr_swaps
+
+        guest1, guest2 = np.unravel_index(np.argmax(deltas), deltas.shape)
+
+        if deltas[guest1, guest2] <= 0:
+            break
+
+        solution.swap(guest1, guest2)
+
+    return evaluations
@@ -7,9 +7,12 @@
 # General
 from copy import deepcopy
 import numpy as np
-import random
 
-def swap_mutation(repr: np.ndarray, _)-> np.ndarray:
+# Seating arrangement problem
+from library.SA_problem.seating_arrangement import as_generator, seated_together
+from library.SA_problem.sparse_relations import SparseRelations
+
+def swap_mutation(repr: np.ndarray, _, rng: np.random.Generator | None = None)-> np.ndarray:
     """
     Applies swap mutation to a solution repr by swapping the table assignments
     of two randomly selected guests if they are assigned to different tables. 
@@ -17,21 +20,23 @@ def swap_mutation(repr: np.ndarray, _)-> np.ndarray:
     It runs for 10 attempts to find 2 random guests seated at different tables.
 
     Parameters:
-        repr (np.ndarray): A 64-element array representing the seating arrangement, where each 
+        repr (np.ndarray): An array with one element per guest representing the seating arrangement, where each 
                             index corresponds to a guest and the value at each index is the table 
-                            number (0 to 7) the guest is assigned to.
+                            number (0 to nr_tables - 1) the guest is assigned to.
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
     
     Returns:
         np.ndarray: New seating arrangement with two guests table assignment swapped.
     """
 
     new_repr = deepcopy(repr)
+    rng = as_generator(rng)
 
     max_attempts = 10
 
     for _ in range(max_attempts):
         # Randomly select two different guests idxs
-        guest1, guest2 = random.sample(range(len(new_repr)), 2)
+        guest1, guest2 = rng.choice(len(new_repr), 2, replace=False)
         if new_repr[guest1] != new_repr[guest2]:
             # Swap only if guests are at different tables
             new_repr[guest1], new_repr[guest2] = new_repr[guest2], new_repr[guest1]
@@ -39,7 +44,7 @@ def swap_mutation(repr: np.ndarray, _)-> np.ndarray:
     
     return new_repr
 
-def inversion_mutation(repr: np.ndarray, _) -> np.ndarray:
+def inversion_mutation(repr: np.ndarray, _, rng: np.random.Generator | None = None) -> np.ndarray:
     """
     Applies inversion mutation to a solution representation.
 
@@ -47,21 +52,23 @@ def inversion_mutation(repr: np.ndarray, _) -> np.ndarray:
     list of all guests. 
 
     Parameters:
-        repr (np.ndarray): A 64-element array representing the seating arrangement, where each 
+        repr (np.ndarray): An array with one element per guest representing the seating arrangement, where each 
                             index corresponds to a guest and the value at each index is the table 
-                            number (0 to 7) the guest is assigned to.
+                            number (0 to nr_tables - 1) the guest is assigned to.
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
     Returns:
-        np.ndarray: A new valid seating arrangement with 1/8 of guests table assigments inversed.
+        np.ndarray: A new valid seating arrangement with up to one table worth of guests table assigments inversed.
     """
 
     new_repr = deepcopy(repr)
+    rng = as_generator(rng)
 
-    # To reduce disruption, limit the inversion to a maximum of 1/8 guests 
-    max_size = int(len(new_repr) / 8)
+    # To reduce disruption, limit the inversion to a maximum of one table worth of guests 
+    max_size = max(2, len(new_repr) // (int(np.max(new_repr)) + 1))
 
     # Randomly select two positions (without replacement)
-    start_idx = random.randint(0, len(new_repr) - max_size)  
-    size = random.randint(2, max_size)
+    start_idx = rng.integers(0, len(new_repr) - max_size + 1)  
+    size = rng.integers(2, max_size + 1)
     end_idx = start_idx + size - 1
 
     # Reverse the subsequence
@@ -69,121 +76,195 @@ def inversion_mutation(repr: np.ndarray, _) -> np.ndarray:
 
     return new_repr
 
-def heuristic_mutation(repr:np.ndarray, relationship_mtx:np.ndarray)-> np.ndarray:  
+def guest_table_affinity(repr: np.ndarray, relationship_mtx: np.ndarray) -> np.ndarray:
+    """
+    Computes the happiness of every guest with the guests of every table, summing the columns
+    of the matrix table by table in O(nr_guests^2), or O(relationships + nr_guests * nr_tables) 
+    for sparse relations.
+
+    Parameters:
+        repr (np.ndarray): An array with one element per guest representing the seating arrangement, where each 
+                            index corresponds to a guest and the value at each index is the table 
+                            number (0 to nr_tables - 1) the guest is assigned to.
+        relationship_mtx (np.ndarray | SparseRelations): Happiness matrix where [i][j] is the happiness guest i has with guest j
+
+    Returns:
+        np.ndarray: A (nr_guests, nr_tables) matrix where [g][t] is the happiness guest g has with 
+                    the guests at table t, not counting g itself.
+    """
+
+    if isinstance(relationship_mtx, SparseRelations):
+        affinity = relationship_mtx.table_sums(repr, int(np.max(repr)) + 1)
+        affinity[np.arange(len(repr)), repr] -= relationship_mtx.diagonal()
+        return affinity
+
+    relationship_mtx = np.asarray(relationship_mtx)
+    counts = np.bincount(repr)
+    occupied = counts > 0
+
+    # Columns ordered by table, then summed over the guests of each occupied table
+    order = np.argsort(repr, kind="stable")
+    starts = (np.cumsum(counts) - counts)[occupied]
+
+    affinity = np.zeros((len(relationship_mtx), len(counts)), dtype=relationship_mtx.dtype)
+    affinity[:, occupied] = np.add.reduceat(relationship_mtx[:, order], starts, axis=1)
+
+    # A guest does not count towards its own happiness
+    affinity[np.arange(len(repr)), repr] -= np.diagonal(relationship_mtx)
+
+    return affinity
+
+def heuristic_mutation(repr:np.ndarray, relationship_mtx:np.ndarray, rng: np.random.Generator | None = None)-> np.ndarray:  
     """
     Applies a heuristic mutation that swaps a guest with another from a different table
     if the swap increases the overall happiness (affinity).
 
+    The gain of swapping the random guest with every candidate is scored at once, from the 
+    happiness of the random guest with every table, of every guest with the table of the random 
+    guest and of every guest at its own table, in O(nr_guests * table size) (O(nr_guests + relationships) 
+    for sparse relations). The best candidate 
+    is the first one with the highest positive gain, as with the candidate by candidate search.
+
     Parameters:
-        repr (np.ndarray): A 64-element array representing the seating arrangement, where each 
+        repr (np.ndarray): An array with one element per guest representing the seating arrangement, where each 
                             index corresponds to a guest and the value at each index is the table 
-                            number (0 to 7) the guest is assigned to.
-        relationship_mtx (np.ndarray): Happiness matrix where [i][j] is the happiness guest i has with guest j
+                            number (0 to nr_tables - 1) the guest is assigned to.
+        relationship_mtx (np.ndarray | SparseRelations): Happiness matrix where [i][j] is the happiness guest i has with guest j
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
 
     Returns:
         np.ndarray: A new valid seating arrangement, where each guest is assigned to a table and only one table.
     """
    
     new_repr = deepcopy(repr)
+    sparse = isinstance(relationship_mtx, SparseRelations)
+    if not sparse:
+        relationship_mtx = np.asarray(relationship_mtx)
 
     # Choose a random guest
-    guest1= random.randint(0, len(repr) - 1)
+    guest1= as_generator(rng).integers(0, len(repr))
 
     # Get the table the guest is assigned to
     table1= repr[guest1]
 
-    # Get the guests assigned to the same table as guest
-    guests_table1 = [i for i in range(len(new_repr)) if new_repr[i] == table1 and i != guest1]
+    table1_guests = np.flatnonzero(new_repr == table1)
+
+    # Dense row and column of guest1, and sum of the columns of the guests at table1
+    if sparse:
+        diagonal = relationship_mtx.diagonal()
+        guest1_row = relationship_mtx.sum_rows([guest1])
+        guest1_column = relationship_mtx.T.sum_rows([guest1])
+        table1_affinity = relationship_mtx.T.sum_rows(table1_guests)
+    else:
+        diagonal = np.diagonal(relationship_mtx)
+        guest1_row = relationship_mtx[guest1]
+        guest1_column = relationship_mtx[:, guest1]
+        table1_affinity = relationship_mtx[:, table1_guests].sum(axis=1)
+
+    # Happiness of guest1 with every table and of every guest with table1, not counting themselves
+    guest1_affinity = np.bincount(new_repr, weights=guest1_row).astype(relationship_mtx.dtype)
+    guest1_affinity[table1] -= diagonal[guest1]
+    table1_affinity[table1_guests] -= diagonal[table1_guests]
+
+    # Happiness of guest1 at each candidate's table without the candidate, plus the happiness of 
+    # each candidate at table1 without guest1, minus their current happiness
+    gain = (guest1_affinity[new_repr] - guest1_row
+            + table1_affinity - guest1_column
+            - guest1_affinity[table1] - seated_together(new_repr, relationship_mtx))
+
+    # Skip same guest or same table (we want a swap between tables)
+    gain = np.where(new_repr != table1, gain, 0)
+
+    # If we found a good swap, apply it
+    best_guest2 = np.argmax(gain)
+
+    if gain[best_guest2] > 0:
+        new_repr[guest1], new_repr[best_guest2] = new_repr[best_guest2], new_repr[guest1]
 
-    # Calculate the current happiness of guest1 at their table
-    current_happiness1 = sum(relationship_mtx[guest1][other] for other in guests_table1)
+    return new_repr
 
-    best_gain = 0
-    best_guest2 = None
+def steepest_heuristic_mutation(repr: np.ndarray, relationship_mtx: np.ndarray, rng: np.random.Generator | None = None) -> np.ndarray:
+    """
+    Applies the swap between two guests from different tables that increases the overall 
+    happiness (affinity) the most, out of all pairs of guests.
 
-    # Go through all possible swap candidates
-    for guest2 in range(len(repr)):
-        table2 = new_repr[guest2]
+    Parameters:
+        repr (np.ndarray): An array with one element per guest representing the seating arrangement, where each 
+                            index corresponds to a guest and the value at each index is the table 
+                            number (0 to nr_tables - 1) the guest is assigned to.
+        relationship_mtx (np.ndarray | SparseRelations): Happiness matrix where [i][j] is the happiness guest i has with guest j
+        rng (np.random.Generator | None): Not used, the mutation is deterministic. Accepted like in the other operators.
 
-        # Skip same guest or same table (we want a swap between tables)
-        is_same_guest = guest2 == guest1
-        is_same_table = table2 == table1
+    Returns:
+        np.ndarray: A new valid seating arrangement, unchanged if no swap increases the happiness.
+    """
 
-        if not is_same_guest and not is_same_table:
-            # Simulate the swap
-            table1_after = [guest2 if g == guest1 else g for g in range(len(new_repr)) if new_repr[g] == table1]
-            table2_after = [guest1 if g == guest2 else g for g in range(len(new_repr)) if new_repr[g] == table2]
+    new_repr = deepcopy(repr)
 
-            # Calculate new happiness
-            new_happiness1 = sum(relationship_mtx[guest1][g] for g in table2_after if g != guest1)
-            new_happiness2 = sum(relationship_mtx[guest2][g] for g in table1_after if g != guest2)
+    # Every pair of guests is scored, so sparse relations are expanded to the full matrix
+    if isinstance(relationship_mtx, SparseRelations):
+        relationship_mtx = relationship_mtx.toarray()
+    relationship_mtx = np.asarray(relationship_mtx)
 
-            # Calculate old happiness of guest2
-            current_happiness2 = sum(relationship_mtx[guest2][g] for g in range(len(new_repr)) if new_repr[g] == table2 and g != guest2)
+    affinity = guest_table_affinity(new_repr, relationship_mtx)
+    guests = np.arange(len(new_repr))
+    current = affinity[guests, new_repr]
 
-            total_gain = (new_happiness1 + new_happiness2) - (current_happiness1 + current_happiness2)
+    # gain[g1][g2]: happiness of g1 at the table of g2 and of g2 at the table of g1, 
+    # without each other, minus their current happiness
+    to_other_table = affinity[:, new_repr] - relationship_mtx
+    gain = to_other_table + to_other_table.T - current[:, None] - current[None, :]
 
-            if total_gain > best_gain:
-                best_gain = total_gain
-                best_guest2 = guest2
+    # Only swaps between different tables
+    gain = np.where(new_repr[:, None] != new_repr[None, :], gain, 0)
 
-    # If we found a good swap, apply it
-    if best_guest2 is not None:
-        new_repr[guest1], new_repr[best_guest2] = new_repr[best_guest2], new_repr[guest1]
+    guest1, guest2 = np.unravel_index(np.argmax(gain), gain.shape)
+
+    if gain[guest1, guest2] > 0:
+        new_repr[guest1], new_repr[guest2] = new_repr[guest2], new_repr[guest1]
 
     return new_repr
 
-def misfit_mutation(repr: np.ndarray, relationship_mtx: np.ndarray) -> np.ndarray:
+def misfit_mutation(repr: np.ndarray, relationship_mtx: np.ndarray, k: int = 2, rng: np.random.Generator | None = None) -> np.ndarray:
     """
     Perform a mutation by identifying and swapping the least happy guests from different tables.
 
     This mutation operator is specifically designed for the seating arrangement problem. It attempts to improve 
     the overall guest happiness by detecting the two least happy guests from different tables and swapping their seats.
 
+    The happiness of every guest at its table is summed table by table. With k > 2, 
+    the k least happy guests (each the least happy of a distinct table) are moved in a single call, each 
+    one to the table of the next in a cycle.
+
     Parameters:
-        repr (np.ndarray): A 64-element array representing the seating arrangement, where each 
+        repr (np.ndarray): An array with one element per guest representing the seating arrangement, where each 
                             index corresponds to a guest and the value at each index is the table 
-                            number (0 to 7) the guest is assigned to.
-        relationship_mtx (np.ndarray): Happiness matrix where [i][j] is the happiness guest i has with guest j
+                            number (0 to nr_tables - 1) the guest is assigned to.
+        relationship_mtx (np.ndarray | SparseRelations): Happiness matrix where [i][j] is the happiness guest i has with guest j
+        k (int): Number of least happy guests to move, at most the number of tables. Defaults to 2, a swap.
+        rng (np.random.Generator | None): Not used, the mutation is deterministic. Accepted like in the other operators.
 
     Returns:
-        np.ndarray: A mutated version of the seating arrangement with the two least happy guests at their table swapped.
+        np.ndarray: A mutated version of the seating arrangement with the k least happy guests at their table moved.
     """
 
     new_repr = deepcopy(repr)
 
-    nr_tables = 8
-
-    # Group guests by table
-    tables = {t: [] for t in range(nr_tables)}
-    for guest, table in enumerate(new_repr):
-        tables[table].append(guest)
-
-    # For each table, find the guest with the lowest happiness
-    least_happy_guests = []
-
-    for table, guests in tables.items():
-        min_happiness = float('inf')
-        least_happy = None
-        for guest in guests:
-            happiness = sum(relationship_mtx[guest][other] for other in guests if other != guest)
-            if happiness < min_happiness:
-                min_happiness = happiness
-                least_happy = guest
-        if least_happy is not None:
-            least_happy_guests.append((least_happy, min_happiness, table))
-    
-    # Get two least-happy guests from different tables
-    least_happy_guests.sort(key=lambda x: x[1])
+    # Happiness of each guest with the other guests at their table
+    guests = np.arange(len(new_repr))
+    happiness = seated_together(new_repr, relationship_mtx)
 
-    guest1, _, table1 = least_happy_guests[0]
-    guest2, _, table2 = least_happy_guests[1]
-
-    # Make sure it's diff tables, if yes swap
-    if table1 != table2:
-        new_repr[guest1], new_repr[guest2] = new_repr[guest2], new_repr[guest1]
-
-    return new_repr
+    # For each table, find the guest with the lowest happiness (the first one on ties), 
+    # by ordering the guests by table, then happiness, then guest
+    order = np.lexsort((guests, happiness, new_repr))
+    is_first = np.r_[True, new_repr[order][1:] != new_repr[order][:-1]]
+    least_happy_guests = order[is_first]
 
+    # Get the k least-happy guests, which are all from different tables
+    least_happy_guests = least_happy_guests[np.argsort(happiness[least_happy_guests], kind="stable")][:k]
 
+    # Each guest takes the table of the next one, for two guests a swap
+    if len(least_happy_guests) > 1:
+        new_repr[least_happy_guests] = new_repr[np.roll(least_happy_guests, -1)]
 
+    return new_repr
@@ -0,0 +1,245 @@
+# Group Members - Group P
+# Joana Esteves | 20240746 
+# Matilde Miguel | 20240549 
+# Tomás Figueiredo | 20240941 
+# Rita Serra | 20240515
+
+# General
+import numpy as np
+from collections.abc import Sequence
+from typing import Callable
+
+# Seating arrangement problem
+from library.SA_problem.seating_arrangement import SAProblem, SASolution, FitnessCache, as_generator, canonical_keys, repr_dtype, validate_reprs
+
+def co_seating_differences(reprs1: np.ndarray, reprs2: np.ndarray, capacities: np.ndarray) -> np.ndarray:
+    """
+    Number of ordered guest pairs seated together in one arrangement but not in the other, for 
+    every row of two blocks of valid arrangements. It compares who sits with whom rather than table 
+    numbers, so relabeling the tables of an arrangement does not change it.
+
+    The pairs are counted from the groups of guests sharing a table in both arrangements, 
+    in O(nr_guests) per row rather than comparing all pairs.
+
+    Parameters:
+        reprs1 (np.ndarray): A (nr_solutions, nr_guests) array, one arrangement per row.
+        reprs2 (np.ndarray): The arrangements to compare with, of the same shape (or one row, broadcast).
+        capacities (np.ndarray): Number of guests of each table.
+
+    Returns:
+        np.ndarray: The number of differing pairs of each row.
+    """
+
+    reprs1, reprs2 = np.broadcast_arrays(reprs1.astype(np.int64), reprs2.astype(np.int64))
+    nr_rows = len(reprs1)
+    nr_tables = len(capacities)
+
+    # Ordered pairs of guests seated together in an arrangement, the same for every valid arrangement
+    together = np.sum(capacities * (capacities - 1))
+
+    # Guests sharing their table in both arrangements, counted per (row, table, other table) 
+    # group: each group of m guests has m * (m - 1) ordered pairs
+    groups = (np.arange(nr_rows)[:, None] * nr_tables + reprs1) * nr_tables + reprs2
+    keys, sizes = np.unique(groups, return_counts=True)
+    together_in_both = np.bincount(keys // nr_tables**2, weights=sizes * (sizes - 1), minlength=nr_rows)
+
+    # Pairs seated together in only one of the two arrangements
+    return 2 * (together - together_in_both.astype(np.int64))
+
+def duplicate_mask(reprs: np.ndarray) -> np.ndarray:
+    """
+    Marks the arrangements that seat the same groups together as an earlier row (equal up to 
+    the table labels), by hashing their canonical forms in a set.
+
+    Parameters:
+        reprs (np.ndarray): A (nr_solutions, nr_guests) array, one arrangement per row.
+
+    Returns:
+        np.ndarray: Boolean mask of the duplicate rows, False for the first occurrence of each arrangement.
+    """
+
+    seen = set()
+    duplicates = np.zeros(len(reprs), dtype=bool)
+
+    for row, key in enumerate(canonical_keys(reprs)):
+        duplicates[row] = key in seen
+        seen.add(key)
+
+    return duplicates
+
+class Population(Sequence):
+
+    def __init__(self, relations_mtx: np.ndarray | SAProblem, reprs: np.ndarray, fitness: np.ndarray = None,
+                 validate: bool = True):
+        """
+        Population of seating arrangements stored as a single matrix.
+
+        All representations live in one contiguous (pop_size, nr_guests) integer array with a parallel
+        fitness vector, where NaN marks a fitness that was not computed yet. Fitness, validation and 
+        the best-k query run batched over the whole population and SASolution objects are only 
+        created on demand when an individual is accessed.
+
+        Parameters:
+            relations_mtx (np.ndarray | SAProblem): Pairwise relationship scores or the problem owning them.
+            reprs (np.ndarray): A (pop_size, nr_guests) array, one seating arrangement per row.
+            fitness (np.ndarray): Known fitness values, NaN where unknown. Defaults to all unknown.
+            validate (bool): If True, validates all representations in one batched call.
+        """
+
+        self.problem = SAProblem.of(relations_mtx)
+        self.nr_tables = self.problem.nr_tables
+        self.nr_guests = self.problem.nr_guests
+
+        # Validated before the cast to the compact type, so out of range labels cannot wrap around into range
+        if validate:
+            reprs = validate_reprs(np.asarray(reprs), self.nr_guests, self.nr_tables, self.problem.capacities)
+
+        self.reprs = np.ascontiguousarray(reprs, dtype=repr_dtype(self.nr_tables))
+
+        if fitness is None:
+            fitness = np.full(len(reprs), np.nan)
+
+        self.fitness = np.asarray(fitness, dtype=float)
+
+    @classmethod
+    def random(cls, relations_mtx: np.ndarray | SAProblem, pop_size: int, rng: np.random.Generator | None = None) -> "Population":
+        """
+        Creates a population of random seating arrangements, each table with its capacity of guests.
+
+        Parameters:
+            relations_mtx (np.ndarray | SAProblem): Pairwise relationship scores or the problem owning them.
+            pop_size (int): Number of individuals.
+            rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
+
+        Returns:
+            Population: The random population.
+        """
+
+        problem = SAProblem.of(relations_mtx)
+        tables = np.repeat(np.arange(problem.nr_tables), problem.capacities)
+
+        # Shuffle every row independently by sorting random keys
+        permutations = np.argsort(as_generator(rng).random((pop_size, problem.nr_guests)), axis=1)
+
+        return cls(problem, tables[permutations], validate=False)
+
+    @property
+    def relations_mtx(self) -> np.ndarray:
+        return self.problem.relations_mtx
+
+    def __len__(self) -> int:
+        return len(self.reprs)
+
+    def __getitem__(self, idx: int) -> SASolution:
+        """
+        Returns a SASolution view over the representation of individual idx, with its known fitness.
+        """
+
+        fitness = self.fitness[idx]
+        fitness = None if np.isnan(fitness) else self.problem.score(fitness)
+
+        return SASolution.from_validated(self.problem, self.reprs[idx], fitness)
+
+    def evaluate(self, evaluator: Callable | None = None, cache: FitnessCache | None = None) -> np.ndarray:
+        """
+        Computes, in a single call, the fitness of every individual whose fitness is unknown.
+        If a fitness cache is given, only the individuals that are not cached are scored.
+
+        Parameters:
+            evaluator (Callable | None): Function (problem, reprs) -> fitness scoring the block of unknown
+                individuals (see evaluation.py). Defaults to the vectorized batch fitness of the problem.
+            cache (FitnessCache | None): Fitness cache to look the individuals up in. Defaults to None.
+
+        Returns:
+            np.ndarray: The fitness vector of the population.
+        """
+
+        unknown = np.isnan(self.fitness)
+
+        if np.any(unknown):
+            self.fitness[unknown] = self.problem.evaluate(self.reprs[unknown], evaluator, cache)
+
+        return self.fitness
+
+    def best(self, k: int = 1) -> np.ndarray:
+        """
+        Indices of the k individuals with the highest fitness, best first.
+
+        Parameters:
+            k (int): Number of individuals.
+
+        Returns:
+            np.ndarray: Indices into the population.
+        """
+
+        fitness = self.evaluate()
+
+        if k == 1:
+            # First individual with the highest fitness
+            return np.array([np.argmax(fitness)])
+
+        if k >= len(fitness):
+            # Stable sort keeps the first individual among ties, as sorted() did
+            return np.argsort(-fitness, kind="stable")
+
+        # Partial selection of the k-th highest fitness, then only the individuals above it and 
+        # the first ones equal to it are sorted, giving the same individuals and order as a stable full sort
+        threshold = -np.partition(-fitness, k - 1)[k - 1]
+        above = np.flatnonzero(fitness > threshold)
+        tied = np.flatnonzero(fitness == threshold)[:k - len(above)]
+        top = np.concatenate((above, tied))
+
+        return top[np.argsort(-fitness[top], kind="stable")]
+
+    def diversity(self) -> float:
+        """
+        Diversity of the population: the average fraction of guest pairs that are seated together in 
+        the best individual but not in another individual, or the other way around.
+
+        It compares who sits with whom rather than table numbers, so relabeling the tables of an 
+        arrangement does not change it. It is 0 when every individual seats the same groups together.
+        It takes O(pop_size * nr_guests) (see co_seating_differences).
+
+        Returns:
+            float: The diversity, between 0 and 1.
+        """
+
+        best = self.reprs[self.best(1)[0]]
+        differences = co_seating_differences(self.reprs, best[None, :], self.problem.capacities).sum()
+        nr_pairs = self.nr_guests * (self.nr_guests - 1)
+
+        return float(differences / (len(self) * nr_pairs))
+
+    def sampled_diversity(self, sample_size: int = 32, rng: np.random.Generator | None = None) -> float:
+        """
+        Cheap estimate of the average pairwise diversity of the population: the average fraction of 
+        guest pairs seated together in one individual but not in the other, over sample_size random 
+        pairs of distinct individuals. It takes O(sample_size * nr_guests), whatever the population size.
+
+        Parameters:
+            sample_size (int): Number of pairs of individuals compared. Defaults to 32.
+            rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
+
+        Returns:
+            float: The estimated diversity, between 0 and 1 (0 for populations of less than two individuals).
+        """
+
+        if len(self) < 2:
+            return 0.0
+
+        # Random pairs of distinct individuals: the second one is offset by 1 to len - 1 positions
+        rng = as_generator(rng)
+        first = rng.integers(0, len(self), size=sample_size)
+        second = (first + rng.integers(1, len(self), size=sample_size)) % len(self)
+
+        differences = co_seating_differences(self.reprs[first], self.reprs[second], self.problem.capacities)
+        nr_pairs = self.nr_guests * (self.nr_guests - 1)
+
+        return float(differences.mean() / nr_pairs)
+
+    def duplicate_rate(self) -> float:
+        """
+        Fraction of the individuals that duplicate an earlier one (same groups seated together).
+        """
+
+        return float(np.count_nonzero(duplicate_mask(self.reprs)) / len(self))
@@ -0,0 +1,206 @@
+# Group Members - Group P
+# Joana Esteves | 20240746 
+# Matilde Miguel | 20240549 
+# Tomás Figueiredo | 20240941 
+# Rita Serra | 20240515
+
+# General
+import time
+
+class PhaseTimer():
+
+    __slots__ = ("time", "calls", "_start")
+
+    def __init__(self):
+        """
+        Accumulated wall time and number of calls of one phase. Used as a context manager,
+        each with block adds one call and its duration.
+        """
+
+        self.time = 0.0
+        self.calls = 0
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.time += time.perf_counter() - self._start
+        self.calls += 1
+
+class PhaseProfiler():
+
+    def __init__(self):
+        """
+        Low-overhead instrumentation of a genetic algorithm run: wall time and calls of every phase
+        (with profiler.phase("selection"): ...), counters without time (profiler.count) and the number
+        of fitness evaluations of every generation.
+
+        Phases can be nested, e.g. the repair inside the crossover: the time of the inner phase is
+        then also part of the time of the outer one.
+        """
+
+        self.phases = {}
+        self.counters = {}
+        self.evaluations_per_generation = []
+
+    def phase(self, name: str) -> PhaseTimer:
+        """
+        Timer of a phase, created on first use.
+        """
+
+        timer = self.phases.get(name)
+
+        if timer is None:
+            timer = self.phases[name] = PhaseTimer()
+
+        return timer
+
+    def count(self, name: str, calls: int = 1):
+        """
+        Adds calls to a counter that is not timed, e.g. the fitness evaluations. Counters are 
+        kept apart from the phases, so they do not show up as phases without time.
+        """
+
+        self.counters[name] = self.counters.get(name, 0) + int(calls)
+
+    def record_evaluations(self, evaluations: int):
+        """
+        Records the number of fitness evaluations of a generation (or of the initial population).
+        """
+
+        self.evaluations_per_generation.append(int(evaluations))
+        self.count("evaluations", evaluations)
+
+    def activate(self) -> "_Activation":
+        """
+        Makes this profiler the active one (see active_profiler) inside a with block, so code
+        that does not receive the profiler, like the repair inside the crossover operators, is timed too.
+        """
+
+        return _Activation(self)
+
+    def report(self) -> dict:
+        """
+        Breakdown of the run.
+
+        Returns:
+            dict:
+                - phases (dict): For each phase, its total time in seconds and number of calls, in order of first use.
+                - counters (dict): Total of each counter, e.g. evaluations.
+                - evaluations_per_generation (list[int]): Fitness evaluations of the initial population, 
+                  then of each generation.
+        """
+
+        return {
+            "phases": {name: {"time": timer.time, "calls": timer.calls} for name, timer in self.phases.items()},
+            "counters": dict(self.counters),
+            "evaluations_per_generation": list(self.evaluations_per_generation),
+        }
+
+class _NullTimer():
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+class NullProfiler():
+    """
+    Profiler that does nothing, used when profiling is off: every phase is the same empty
+    context manager, so the instrumented code only pays for a method call.
+    """
+
+    _timer = _NullTimer()
+
+    def phase(self, name: str) -> _NullTimer:
+        return self._timer
+
+    def count(self, name: str, calls: int = 1):
+        pass
+
+    def record_evaluations(self, evaluations: int):
+        pass
+
+    def activate(self) -> _NullTimer:
+        return self._timer
+
+    def report(self) -> None:
+        return None
+
+# Shared instance used when profiling is off
+NULL_PROFILER = NullProfiler()
+
+# Profiler activated by PhaseProfiler.activate, if any
+_active_profiler = NULL_PROFILER
+
+class _Activation():
+
+    __slots__ = ("profiler", "previous")
+
+    def __init__(self, profiler: PhaseProfiler):
+        self.profiler = profiler
+        self.previous = None
+
+    def __enter__(self):
+        global _active_profiler
+        self.previous, _active_profiler = _active_profiler, self.profiler
+        return self.profiler
+
+    def __exit__(self, *exc):
+        global _active_profiler
+        _active_profiler = self.previous
+
+def active_profiler() -> PhaseProfiler | NullProfiler:
+    """
+    The profiler activated by the run in progress, or the null profiler.
+    """
+
+    return _active_profiler
+
+def merge_profiles(reports: list[dict | None]) -> dict | None:
+    """
+    Aggregates the profiles of several runs (PhaseProfiler.report): the times and calls of every phase
+    are added up, as well as the counters, and the evaluations of each generation averaged over the runs 
+    that reached it.
+
+    Parameters:
+        reports (list[dict | None]): Profiles of the runs, None for runs that were not profiled.
+
+    Returns:
+        dict | None: The merged profile, with the number of profiled runs, or None if no run was profiled.
+    """
+
+    reports = [report for report in reports if report is not None]
+
+    if not reports:
+        return None
+
+    phases = {}
+    counters = {}
+    evaluations = []
+
+    for report in reports:
+        for name, phase in report["phases"].items():
+            merged = phases.setdefault(name, {"time": 0.0, "calls": 0})
+            merged["time"] += phase["time"]
+            merged["calls"] += phase["calls"]
+
+        for name, total in report["counters"].items():
+            counters[name] = counters.get(name, 0) + total
+
+        for generation, count in enumerate(report["evaluations_per_generation"]):
+            if generation == len(evaluations):
+                evaluations.append([])
+            evaluations[generation].append(count)
+
+    return {
+        "runs": len(reports),
+        "phases": phases,
+        "counters": counters,
+        "evaluations_per_generation": [sum(counts) / len(counts) for counts in evaluations],
+    }
@@ -0,0 +1,215 @@
+# Group Members - Group P
+# Joana Esteves | 20240746 
+# Matilde Miguel | 20240549 
+# Tomás Figueiredo | 20240941 
+# Rita Serra | 20240515
+
+# General
+import pandas as pd
+import numpy as np
+
+# Files
+import csv
+import glob
+import os
+import shutil
+import importlib.util
+
+# Supported output formats
+RESULTS_FORMATS = ("csv", "npz", "parquet")
+
+class ResultsSink():
+
+    def __init__(self, timestamp: str, tables: dict[str, list[str]], format: str = "csv",
+                 buffer_size: int = 10000, directory: str = "."):
+        """
+        Buffered writer for the result tables of a search.
+
+        Rows are kept in memory and written in bulk once a table buffers buffer_size rows (and on flush),
+        instead of reopening a file for every row. Tables are stored as:
+        - csv: one <table>_<timestamp>.csv file per table, as before.
+        - npz: a <table>_<timestamp> directory with one compressed columnar part-xxxxx.npz file per flush.
+        - parquet: a <table>_<timestamp> directory with one part-xxxxx.parquet file per flush
+          (needs pyarrow or fastparquet).
+
+        Parameters:
+            timestamp (str): Timestamp used in the names of the files.
+            tables (dict[str, list[str]]): Columns of each table, by table name.
+            format (str): Output format, one of "csv", "npz" or "parquet". Defaults to "csv".
+            buffer_size (int): Number of rows of a table buffered before writing. Defaults to 10000.
+            directory (str): Directory of the files. Defaults to the working directory.
+        """
+
+        if format not in RESULTS_FORMATS:
+            raise ValueError(f"Results format must be one of {RESULTS_FORMATS}.")
+
+        if format == "parquet" and not (importlib.util.find_spec("pyarrow") or importlib.util.find_spec("fastparquet")):
+            raise ImportError("Parquet results need pyarrow or fastparquet installed, use the npz format instead.")
+
+        self.timestamp = timestamp
+        self.tables = tables
+        self.format = format
+        self.buffer_size = buffer_size
+        self.directory = directory
+        self.buffers = {table: [] for table in tables}
+
+        for table, columns in tables.items():
+            if self.exists(table):
+                continue
+
+            if format == "csv":
+                with open(self.path(table), mode='w', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(columns)
+            else:
+                os.makedirs(self.path(table))
+
+    def path(self, table: str) -> str:
+        """
+        Path of the file (csv) or directory (npz, parquet) of a table.
+        """
+
+        name = f"{table}_{self.timestamp}"
+
+        return os.path.join(self.directory, f"{name}.csv" if self.format == "csv" else name)
+
+    def exists(self, table: str) -> bool:
+        return os.path.exists(self.path(table))
+
+    def append(self, table: str, row: list):
+        """
+        Buffers one row of a table, writing all buffers once the table is full.
+
+        Parameters:
+            table (str): Name of the table.
+            row (list): Values of the row, in the order of the table columns.
+        """
+
+        self.buffers[table].append(row)
+
+        if len(self.buffers[table]) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered rows of every table, in the order the tables were declared.
+        """
+
+        for table, rows in self.buffers.items():
+            if rows:
+                self._write(table, pd.DataFrame(rows, columns=self.tables[table]))
+                self.buffers[table] = []
+
+    def close(self):
+        self.flush()
+
+    def _write(self, table: str, df: pd.DataFrame):
+        # Append the rows in bulk to the csv or write them as a new columnar part
+        if self.format == "csv":
+            df.to_csv(self.path(table), mode='a', header=False, index=False)
+            return
+
+        part = os.path.join(self.path(table), f"part-{len(os.listdir(self.path(table))):05d}.{self.format}")
+
+        if self.format == "npz":
+            # Text columns as fixed width unicode arrays, so they load without pickle
+            np.savez_compressed(part, **{
+                column: df[column].to_numpy() if pd.api.types.is_numeric_dtype(df[column]) else df[column].to_numpy().astype(str)
+                for column in df.columns
+            })
+        else:
+            df.to_parquet(part, index=False)
+
+    def load(self, table: str) -> pd.DataFrame:
+        """
+        Reads a table back in a single call, including the rows still in the buffer.
+
+        Parameters:
+            table (str): Name of the table.
+
+        Returns:
+            pd.DataFrame: The table.
+        """
+
+        df = load_results(table, self.timestamp, self.format, self.directory, self.tables[table])
+
+        if self.buffers[table]:
+            df = pd.concat([df, pd.DataFrame(self.buffers[table], columns=self.tables[table])], ignore_index=True)
+
+        return df
+
+    def rewrite(self, table: str, df: pd.DataFrame):
+        """
+        Replaces the whole content of a table.
+
+        Parameters:
+            table (str): Name of the table.
+            df (pd.DataFrame): The new content.
+        """
+
+        self.buffers[table] = []
+
+        if self.format == "csv":
+            df.to_csv(self.path(table), index=False)
+        else:
+            shutil.rmtree(self.path(table))
+            os.makedirs(self.path(table))
+            if len(df):
+                self._write(table, df)
+
+    def export_csv(self, table: str, path: str | None = None) -> str:
+        """
+        Exports a table to csv, e.g. to analyse npz or parquet results with the usual tools.
+
+        Parameters:
+            table (str): Name of the table.
+            path (str | None): Path of the csv. Defaults to <table>_<timestamp>.csv in the results directory.
+
+        Returns:
+            str: Path of the csv.
+        """
+
+        if path is None:
+            path = os.path.join(self.directory, f"{table}_{self.timestamp}.csv")
+
+        self.load(table).to_csv(path, index=False)
+
+        return path
+
+def load_results(table: str, timestamp: str, format: str = "csv", directory: str = ".",
+                 columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Loads a result table written by ResultsSink in a single read.
+
+    Parameters:
+        table (str): Name of the table, e.g. "fitness_per_run".
+        timestamp (str): Timestamp of the search.
+        format (str): Format of the results, one of "csv", "npz" or "parquet". Defaults to "csv".
+        directory (str): Directory of the files. Defaults to the working directory.
+        columns (list[str] | None): Columns of the table, used when no rows were written yet.
+
+    Returns:
+        pd.DataFrame: The table.
+    """
+
+    name = os.path.join(directory, f"{table}_{timestamp}")
+
+    if format == "csv":
+        return pd.read_csv(f"{name}.csv")
+
+    parts = sorted(glob.glob(os.path.join(name, f"part-*.{format}")))
+
+    if not parts:
+        return pd.DataFrame(columns=columns)
+
+    if format == "parquet":
+        return pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+
+    # Concatenate each column across parts
+    loaded = [np.load(part) for part in parts]
+    df = pd.DataFrame({column: np.concatenate([part[column] for part in loaded]) for column in loaded[0].files})
+
+    for part in loaded:
+        part.close()
+
+    return df
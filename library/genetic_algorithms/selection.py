@@ -5,83 +5,205 @@
 # Rita Serra | 20240515
 
 # General
-import random
-from copy import deepcopy
+import numpy as np
+from functools import partial
+from typing import Callable
 
 # Seating arrangement problem
-from library.SA_problem.seating_arrangement import SASolution
+from library.SA_problem.seating_arrangement import SASolution, as_generator
 
-def fitness_proportionate_selection(population: list[SASolution]) -> SASolution:
+# Population
+from .population import Population
+
+def fitness_vector(population: Population | list[SASolution]) -> np.ndarray:
     """
-    Selects an individual using fitness-proportionate (roulette wheel) selection.
+    Returns the fitness of every individual in the population as a numpy array, 
+    reusing the cached fitness values.
 
     Parameters:
-        population (list[SAGASolution]): A list of SeatingArrangement objects.
+        population (Population | list[SASolution]): The population.
 
     Returns:
-         A deepcopy of the selected individual.
+        np.ndarray: The fitness values, in population order.
     """
 
-    fitness_values = [ind.fitness() for ind in population]
+    if isinstance(population, Population):
+        return population.evaluate()
 
-    total_fitness = sum(fitness_values)
+    return np.array([ind.fitness() for ind in population], dtype=float)
+
+def fitness_proportionate_indices(fitness: np.ndarray, n: int = 1, rng: np.random.Generator | None = None) -> np.ndarray:
+    """
+    Draws n individuals at once using fitness-proportionate (roulette wheel) selection.
 
-    # Generate random number between 0 and total
-    random_nr = random.uniform(0, total_fitness)
-    box_boundary = 0
+    Each individual owns a "box" of the roulette proportional to its fitness. The box boundaries
+    are the cumulative sum of the fitness values, so each draw is a binary search (searchsorted).
 
-    # For each individual, check if random number is inside the individual's "box"
-    for ind_idx, ind in enumerate(population):
-        box_boundary += fitness_values[ind_idx]
-        if random_nr <= box_boundary:
-            return deepcopy(ind)
-        
+    Parameters:
+        fitness (np.ndarray): Precomputed fitness of each individual.
+        n (int): Number of individuals to select.
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
 
-def ranking_selection(population: list[SASolution]) -> SASolution:
+    Returns:
+        np.ndarray: Indices of the selected individuals.
     """
-    Selects an individual using ranking selection.
+
+    box_boundaries = np.cumsum(fitness)
+
+    # Generate random numbers between 0 and total
+    random_nrs = as_generator(rng).uniform(0, box_boundaries[-1], size=n)
+
+    # First individual whose box boundary is >= the random number
+    idxs = np.searchsorted(box_boundaries, random_nrs, side="left")
+
+    return np.minimum(idxs, len(fitness) - 1)
+
+def ranking_indices(fitness: np.ndarray, n: int = 1, rng: np.random.Generator | None = None) -> np.ndarray:
+    """
+    Draws n individuals at once using ranking selection.
+
+    In maximization, the individual with the highest fitness receives the highest rank (N),
+    and the probability of being selected is proportional to the rank.
+
+    Parameters:
+        fitness (np.ndarray): Precomputed fitness of each individual.
+        n (int): Number of individuals to select.
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
+
+    Returns:
+        np.ndarray: Indices of the selected individuals.
+    """
+
+    # Ascending order, stable so ties keep population order
+    ranked_idxs = np.argsort(fitness, kind="stable")
+
+    # Box boundaries of the ranks 1 to N
+    box_boundaries = np.cumsum(np.arange(1, len(fitness) + 1))
+
+    random_nrs = as_generator(rng).uniform(0, box_boundaries[-1], size=n)
+    positions = np.minimum(np.searchsorted(box_boundaries, random_nrs, side="left"), len(fitness) - 1)
+
+    return ranked_idxs[positions]
+
+def tournament_indices(fitness: np.ndarray, n: int = 1, tournament_size: int = 5,
+                       rng: np.random.Generator | None = None) -> np.ndarray:
+    """
+    Runs n tournaments at once and returns the winner of each.
+
+    Participants are drawn without replacement within each tournament. Small tournaments draw 
+    their participants directly and redraw the rows that got the same individual twice, which is rare. 
+    Larger tournaments, where repeats are likely, take the individuals with the k smallest of 
+    one random key per individual.
+
+    Parameters:
+        fitness (np.ndarray): Precomputed fitness of each individual.
+        n (int): Number of individuals to select.
+        tournament_size (int): Number of individuals to participate in each tournament.
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
+
+    Returns:
+        np.ndarray: Indices of the selected individuals.
+    """
+
+    if tournament_size > len(fitness):
+        raise ValueError("Tournament size cannot be larger than the population.")
+
+    rng = as_generator(rng)
+
+    # Expected number of repeated pairs per tournament, at most 1 keeps the redraws rare
+    if tournament_size * (tournament_size - 1) / 2 <= len(fitness):
+        tournaments = rng.integers(0, len(fitness), size=(n, tournament_size))
+
+        # Redraw tournaments with repeated participants
+        while True:
+            sorted_participants = np.sort(tournaments, axis=1)
+            repeated = np.any(sorted_participants[:, 1:] == sorted_participants[:, :-1], axis=1)
+            if not np.any(repeated):
+                break
+            tournaments[repeated] = rng.integers(0, len(fitness), size=(np.sum(repeated), tournament_size))
+    else:
+        keys = rng.random((n, len(fitness)))
+        tournaments = np.argpartition(keys, tournament_size - 1, axis=1)[:, :tournament_size]
+
+    # The first participant with the highest fitness wins, as with max()
+    winners = np.argmax(fitness[tournaments], axis=1)
+
+    return tournaments[np.arange(n), winners]
+
+def fitness_proportionate_selection(population: Population | list[SASolution], rng: np.random.Generator | None = None) -> SASolution:
+    """
+    Selects an individual using fitness-proportionate (roulette wheel) selection.
 
     Parameters:
-        population (list[SAGASolution]): A list of SeatingArrangement objects.
+        population (Population | list[SASolution]): The population.
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
 
     Returns:
-         A deepcopy of the selected individual.
+         The selected individual. It is not copied, operators never modify their parents.
     """
 
-    # In maximization, the individual with the highest fitness receives the highest rank.
-    sorted_population = sorted(
-    population, key=lambda ind: ind.fitness(), reverse=False
-    )
-    
-    # Create an ascending ranking from 1 to N=len(population)+1
-    rank_scores= range(1, len(sorted_population) + 1) 
+    idx = fitness_proportionate_indices(fitness_vector(population), rng=rng)[0]
 
-    total_rank_scores = sum(rank_scores)
+    return population[idx]
 
-    # Generate random number between 0 and total
-    random_nr = random.uniform(0, total_rank_scores)
-    box_boundary = 0
+def ranking_selection(population: Population | list[SASolution], rng: np.random.Generator | None = None) -> SASolution:
+    """
+    Selects an individual using ranking selection.
 
-    for ind_idx, ind in enumerate(sorted_population):
-        box_boundary += rank_scores[ind_idx]
-        if random_nr <= box_boundary:
-            return deepcopy(ind)
+    Parameters:
+        population (Population | list[SASolution]): The population.
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
 
+    Returns:
+         The selected individual. It is not copied, operators never modify their parents.
+    """
+
+    idx = ranking_indices(fitness_vector(population), rng=rng)[0]
 
-def tournament_selection(population: list[SASolution],  tournament_size: int = 5) -> SASolution:
+    return population[idx]
+
+def tournament_selection(population: Population | list[SASolution], tournament_size: int = 5,
+                         rng: np.random.Generator | None = None) -> SASolution:
     """
     Selects an individual using tournament selection.
 
     Parameters:
-        population (list[SAGASolution]): A list of SeatingArrangement objects.
+        population (Population | list[SASolution]): The population.
         tournament_size (int): Number of individuals to participate in the tournament.
-        maximization (bool): If True, maximizes the fitness function; otherwise, minimizes.
+        rng (np.random.Generator | None): Random generator to draw from. Defaults to a new unseeded generator.
+
+    Returns:
+         The selected individual. It is not copied, operators never modify their parents.
+    """
+
+    idx = tournament_indices(fitness_vector(population), tournament_size=tournament_size, rng=rng)[0]
+
+    return population[idx]
+
+# Batched variant of each selection operator
+BATCHED_SELECTION = {
+    fitness_proportionate_selection: fitness_proportionate_indices,
+    ranking_selection: ranking_indices,
+    tournament_selection: tournament_indices,
+}
+
+def batched_selection(selection_algorithm: Callable) -> Callable | None:
+    """
+    Finds the batched variant of a selection operator, which draws all the parents of a 
+    generation at once from the fitness vector. Keyword arguments bound with functools.partial 
+    (e.g. the tournament size) are carried over.
+
+    Parameters:
+        selection_algorithm (Callable): A selection operator, possibly wrapped in functools.partial.
 
     Returns:
-         A deepcopy of the selected individual.
+        Callable | None: A function (fitness, n, rng) -> indices, or None if the operator has no batched variant.
     """
-    
-    # random.sample-> selects, randomly, the individuals without replacement 
-    tournament = random.sample(population, k=tournament_size)
 
-    return deepcopy(max(tournament, key=lambda ind: ind.fitness()))
+    if isinstance(selection_algorithm, partial):
+        batched = BATCHED_SELECTION.get(selection_algorithm.func)
+        if batched is None or selection_algorithm.args:
+            return None
+        return partial(batched, **selection_algorithm.keywords)
+
+    return BATCHED_SELECTION.get(selection_algorithm)
@@ -0,0 +1,43 @@
+# Group Members - Group P
+# Joana Esteves | 20240746
+# Matilde Miguel | 20240549
+# Tomás Figueiredo | 20240941
+# Rita Serra | 20240515
+
+# General
+import os
+import pandas as pd
+import numpy as np
+import pytest
+
+# Seating arrangement problem
+from library.SA_problem.seating_arrangement import SAProblem
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "seating_data.csv")
+
+@pytest.fixture(scope="session")
+def relations_mtx() -> np.ndarray:
+    """
+    Relationship matrix of the 64 wedding guests.
+    """
+
+    return pd.read_csv(DATA_PATH, index_col=0).to_numpy()
+
+@pytest.fixture(scope="session")
+def problem(relations_mtx: np.ndarray) -> SAProblem:
+    """
+    The wedding problem, 8 tables of 8 guests.
+    """
+
+    return SAProblem(relations_mtx)
+
+@pytest.fixture
+def reprs(problem: SAProblem) -> np.ndarray:
+    """
+    A block of 50 random valid arrangements.
+    """
+
+    tables = np.repeat(np.arange(problem.nr_tables), problem.capacities)
+    rng = np.random.default_rng(0)
+
+    return np.array([rng.permutation(tables) for _ in range(50)])
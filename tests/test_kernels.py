@@ -0,0 +1,269 @@
+# Group Members - Group P
+# Joana Esteves | 20240746
+# Matilde Miguel | 20240549
+# Tomás Figueiredo | 20240941
+# Rita Serra | 20240515
+
+"""
+Checks of the batched and vectorized kernels against the original loop based implementations,
+on the relationship matrix of seating_data.csv.
+"""
+
+# General
+from collections import Counter
+import numpy as np
+import pytest
+
+# Seating arrangement problem
+from library.SA_problem.seating_arrangement import SASolution
+from library.SA_problem.sparse_relations import SparseRelations
+
+# Genetic algorithm
+from library.genetic_algorithms.population import Population
+from library.genetic_algorithms.crossover import repair_repr, repair_reprs
+from library.genetic_algorithms.mutation import guest_table_affinity, heuristic_mutation, misfit_mutation
+from library.genetic_algorithms.selection import fitness_proportionate_indices, ranking_indices, tournament_indices
+
+# Loop based references
+
+def loop_fitness(repr: np.ndarray, relations_mtx: np.ndarray, nr_tables: int = 8) -> int:
+    """
+    Sum of the relationship scores of every pair of guests seated at the same table.
+    """
+
+    fitness = 0
+    for table in range(nr_tables):
+        guests = [guest for guest in range(len(repr)) if repr[guest] == table]
+        for i in range(len(guests)):
+            for j in range(i + 1, len(guests)):
+                fitness += relations_mtx[guests[i], guests[j]]
+
+    return fitness
+
+def loop_repair(arr: np.ndarray, nr_tables: int = 8, capacity: int = 8) -> np.ndarray:
+    """
+    Moves the first guests of each over-represented table to the missing tables, highest first.
+    """
+
+    table_counts = Counter(arr)
+    missing = []
+    for table in range(nr_tables):
+        missing.extend([table] * max(capacity - table_counts.get(table, 0), 0))
+
+    arr = arr.copy()
+    for i in range(len(arr)):
+        if table_counts[arr[i]] > capacity:
+            replacement = missing.pop()
+            table_counts[arr[i]] -= 1
+            arr[i] = replacement
+            table_counts[replacement] += 1
+
+    return arr
+
+def loop_heuristic_mutation(repr: np.ndarray, relations_mtx: np.ndarray, guest1: int) -> np.ndarray:
+    """
+    Swaps guest1 with the first guest of another table that increases the happiness the most, if any.
+    """
+
+    new_repr = repr.copy()
+    table1 = repr[guest1]
+    current_happiness1 = sum(relations_mtx[guest1][g] for g in range(len(repr)) if repr[g] == table1 and g != guest1)
+
+    best_gain = 0
+    best_guest2 = None
+    for guest2 in range(len(repr)):
+        table2 = repr[guest2]
+        if table2 == table1:
+            continue
+
+        new_happiness1 = sum(relations_mtx[guest1][g] for g in range(len(repr)) if repr[g] == table2 and g != guest2)
+        new_happiness2 = sum(relations_mtx[guest2][g] for g in range(len(repr)) if repr[g] == table1 and g != guest1)
+        current_happiness2 = sum(relations_mtx[guest2][g] for g in range(len(repr)) if repr[g] == table2 and g != guest2)
+
+        total_gain = (new_happiness1 + new_happiness2) - (current_happiness1 + current_happiness2)
+        if total_gain > best_gain:
+            best_gain = total_gain
+            best_guest2 = guest2
+
+    if best_guest2 is not None:
+        new_repr[guest1], new_repr[best_guest2] = new_repr[best_guest2], new_repr[guest1]
+
+    return new_repr
+
+def loop_misfit_mutation(repr: np.ndarray, relations_mtx: np.ndarray, nr_tables: int = 8) -> np.ndarray:
+    """
+    Swaps the two least happy guests of their tables, taken from different tables.
+    """
+
+    new_repr = repr.copy()
+    least_happy_guests = []
+
+    for table in range(nr_tables):
+        guests = [guest for guest in range(len(repr)) if repr[guest] == table]
+        happiness = [sum(relations_mtx[guest][other] for other in guests if other != guest) for guest in guests]
+        idx = int(np.argmin(happiness))
+        least_happy_guests.append((guests[idx], happiness[idx]))
+
+    least_happy_guests.sort(key=lambda x: x[1])
+    guest1, guest2 = least_happy_guests[0][0], least_happy_guests[1][0]
+    new_repr[guest1], new_repr[guest2] = new_repr[guest2], new_repr[guest1]
+
+    return new_repr
+
+def unbalanced_reprs(reprs: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    One-point crossover of consecutive arrangements, which leaves tables over and under their capacity.
+    """
+
+    points = rng.integers(1, reprs.shape[1], size=len(reprs))
+    mask = np.arange(reprs.shape[1]) >= points[:, None]
+
+    return np.where(mask, np.roll(reprs, 1, axis=0), reprs)
+
+# Fitness
+
+def test_batch_fitness_matches_loop(problem, relations_mtx, reprs):
+    expected = [loop_fitness(repr, relations_mtx) for repr in reprs]
+
+    assert np.array_equal(problem.batch_fitness(reprs), expected)
+    assert np.array_equal(Population(problem, reprs).evaluate(), expected)
+    assert [SASolution(problem, repr).fitness() for repr in reprs] == expected
+
+def test_sparse_batch_fitness_matches_loop(relations_mtx, reprs):
+    sparse = SparseRelations.from_dense(relations_mtx)
+    expected = [loop_fitness(repr, relations_mtx) for repr in reprs]
+
+    assert np.array_equal(Population(sparse, reprs).evaluate(), expected)
+
+# Swap deltas
+
+def test_swap_deltas_match_recomputed_fitness(problem, relations_mtx, reprs):
+    for repr in reprs[:5]:
+        solution = SASolution(problem, repr)
+        fitness = loop_fitness(repr, relations_mtx)
+
+        for guest1 in (0, 17, 63):
+            expected = []
+            for guest2 in range(len(repr)):
+                swapped = repr.copy()
+                swapped[guest1], swapped[guest2] = swapped[guest2], swapped[guest1]
+                expected.append(loop_fitness(swapped, relations_mtx) - fitness)
+
+            assert np.array_equal(solution.swap_deltas(guest1), expected)
+            assert [SASolution(problem, repr).swap_delta(guest1, guest2) for guest2 in range(len(repr))] == expected
+
+def test_swap_keeps_fitness_and_affinity(problem, relations_mtx, reprs):
+    solution = SASolution(problem, reprs[0])
+    solution.affinity
+    rng = np.random.default_rng(1)
+
+    for _ in range(20):
+        guest1, guest2 = rng.choice(len(reprs[0]), size=2, replace=False)
+        solution.swap(guest1, guest2)
+
+    assert solution.fitness() == loop_fitness(solution.repr, relations_mtx)
+    assert np.array_equal(solution.affinity, problem.affinity(solution.repr))
+
+# Mutations
+
+def test_guest_table_affinity_matches_loop(relations_mtx, reprs):
+    repr = reprs[0]
+    expected = [[sum(relations_mtx[guest][other] for other in range(len(repr)) if repr[other] == table and other != guest)
+                 for table in range(8)] for guest in range(len(repr))]
+
+    assert np.array_equal(guest_table_affinity(repr, relations_mtx), expected)
+    assert np.array_equal(guest_table_affinity(repr, SparseRelations.from_dense(relations_mtx)), expected)
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_heuristic_mutation_matches_loop(relations_mtx, reprs, sparse):
+    mtx = SparseRelations.from_dense(relations_mtx) if sparse else relations_mtx
+
+    for seed, repr in enumerate(reprs):
+        # Same random guest as the mutation draws
+        guest1 = np.random.default_rng(seed).integers(0, len(repr))
+        expected = loop_heuristic_mutation(repr, relations_mtx, guest1)
+
+        assert np.array_equal(heuristic_mutation(repr, mtx, rng=np.random.default_rng(seed)), expected)
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_misfit_mutation_matches_loop(relations_mtx, reprs, sparse):
+    mtx = SparseRelations.from_dense(relations_mtx) if sparse else relations_mtx
+
+    for repr in reprs:
+        assert np.array_equal(misfit_mutation(repr, mtx), loop_misfit_mutation(repr, relations_mtx))
+
+# Repair
+
+def test_repair_matches_loop(reprs):
+    block = unbalanced_reprs(reprs, np.random.default_rng(2))
+    expected = np.array([loop_repair(arr) for arr in block])
+
+    assert np.array_equal(repair_reprs(block), expected)
+    assert np.array_equal(np.array([repair_repr(arr) for arr in block]), expected)
+
+    # In place, for the compact dtype of the population
+    compact = block.astype(np.int8)
+    repair_reprs(compact, out=compact)
+    assert np.array_equal(compact, expected)
+
+def test_repair_keeps_valid_reprs(reprs):
+    assert np.array_equal(repair_reprs(reprs), reprs)
+
+def test_repair_uneven_capacities(reprs):
+    capacities = np.array([10, 10, 6, 6, 8, 8, 8, 8])
+    block = np.sort(unbalanced_reprs(reprs, np.random.default_rng(3)), axis=1)
+    repaired = repair_reprs(block, capacities)
+
+    counts = np.array([np.bincount(row, minlength=8) for row in repaired])
+    assert np.all(counts == capacities)
+
+# Selection
+
+@pytest.fixture
+def fitness(reprs, problem) -> np.ndarray:
+    return problem.batch_fitness(reprs).astype(float)
+
+def test_fitness_proportionate_indices_match_loop(fitness):
+    random_nrs = np.random.default_rng(4).uniform(0, np.sum(fitness), size=200)
+    expected = []
+    for random_nr in random_nrs:
+        box_boundary = 0
+        for idx, value in enumerate(fitness):
+            box_boundary += value
+            if random_nr <= box_boundary:
+                expected.append(idx)
+                break
+
+    assert np.array_equal(fitness_proportionate_indices(fitness, 200, rng=np.random.default_rng(4)), expected)
+
+def test_ranking_indices_match_loop(fitness):
+    ranked = sorted(range(len(fitness)), key=lambda idx: fitness[idx])
+    rank_scores = range(1, len(fitness) + 1)
+    random_nrs = np.random.default_rng(5).uniform(0, sum(rank_scores), size=200)
+    expected = []
+    for random_nr in random_nrs:
+        box_boundary = 0
+        for position, idx in enumerate(ranked):
+            box_boundary += rank_scores[position]
+            if random_nr <= box_boundary:
+                expected.append(idx)
+                break
+
+    assert np.array_equal(ranking_indices(fitness, 200, rng=np.random.default_rng(5)), expected)
+
+@pytest.mark.parametrize("tournament_size", [2, 5, 10, 40])
+def test_tournament_indices_draw_without_replacement(fitness, tournament_size):
+    winners = tournament_indices(fitness, 500, tournament_size, rng=np.random.default_rng(6))
+
+    # Distinct participants: the winner is at least as fit as tournament_size - 1 other individuals
+    not_fitter = np.sum(fitness[None, :] <= fitness[winners, None], axis=1) - 1
+    assert np.all(not_fitter >= tournament_size - 1)
+
+def test_tournament_of_whole_population_picks_best(fitness):
+    winners = tournament_indices(fitness, 10, len(fitness), rng=np.random.default_rng(7))
+
+    assert np.all(winners == np.argmax(fitness))
+
+def test_tournament_larger_than_population(fitness):
+    with pytest.raises(ValueError):
+        tournament_indices(fitness, 1, len(fitness) + 1)
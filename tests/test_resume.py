@@ -0,0 +1,79 @@
+# Group Members - Group P
+# Joana Esteves | 20240746
+# Matilde Miguel | 20240549
+# Tomás Figueiredo | 20240941
+# Rita Serra | 20240515
+
+"""
+Round trip of a grid search through its run manifest: resuming a search gives the same runs as
+running it in one go.
+"""
+
+# General
+import os
+import pytest
+
+# Genetic algorithm
+from library.genetic_algorithms.grid_search_parallelized import RESULT_TABLES, grid_search_par, load_run_manifest
+from library.genetic_algorithms.results import ResultsSink, load_results
+from library.genetic_algorithms.mutation import swap_mutation
+from library.genetic_algorithms.crossover import cycle_crossover
+from library.genetic_algorithms.selection import tournament_selection
+
+def search(relations_mtx, runs, generations = 3, resume = None):
+    return grid_search_par(relations_mtx, [swap_mutation], [cycle_crossover], [tournament_selection],
+                           pop_size=20, generations=generations, runs=runs, seed=3, max_workers=1, resume=resume)
+
+def search_timestamp() -> str:
+    return [name for name in os.listdir(".") if name.startswith("runs_")][0][len("runs_"):-len(".csv")]
+
+def manifest(timestamp: str) -> dict:
+    return load_run_manifest(ResultsSink(timestamp, RESULT_TABLES))
+
+@pytest.mark.parametrize("generations", [1, 3])
+def test_resume_matches_uninterrupted_search(relations_mtx, tmp_path, monkeypatch, generations):
+    (tmp_path / "full").mkdir()
+    (tmp_path / "resumed").mkdir()
+
+    monkeypatch.chdir(tmp_path / "full")
+    full = search(relations_mtx, 3, generations)
+    full_timestamp = search_timestamp()
+    expected = manifest(full_timestamp)
+    expected_averages = load_results("avg_fitness_per_generation", full_timestamp)
+
+    # Interrupted after two of the three runs, then resumed
+    monkeypatch.chdir(tmp_path / "resumed")
+    search(relations_mtx, 2, generations)
+    timestamp = search_timestamp()
+    resumed = search(relations_mtx, 3, generations, resume=timestamp)
+    finished_runs = manifest(timestamp)
+
+    assert finished_runs.keys() == expected.keys()
+    for key, run in expected.items():
+        assert finished_runs[key]["spawn_key"] == run["spawn_key"]
+        assert finished_runs[key]["best_fitness"] == run["best_fitness"]
+        assert finished_runs[key]["fitness_per_gen"] == run["fitness_per_gen"]
+        assert list(finished_runs[key]["best_repr"]) == list(run["best_repr"])
+
+    assert resumed[0]["last_gen_avg_fitness"] == full[0]["last_gen_avg_fitness"]
+    # The averages of the combination are logged once, after its last run
+    averages = load_results("avg_fitness_per_generation", timestamp)
+    assert averages["avg_fitness"].tolist() == expected_averages["avg_fitness"].tolist()
+
+def test_resume_of_finished_search_adds_no_runs(relations_mtx, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    search(relations_mtx, 2)
+    timestamp = search_timestamp()
+    finished_runs = manifest(timestamp)
+
+    search(relations_mtx, 2, resume=timestamp)
+
+    assert len(load_results("runs", timestamp)) == len(finished_runs)
+    assert manifest(timestamp).keys() == finished_runs.keys()
+
+def test_resume_without_manifest(relations_mtx, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(FileNotFoundError):
+        search(relations_mtx, 2, resume="2000-01-01_00-00-00")